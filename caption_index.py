@@ -0,0 +1,288 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+from config import CONFIG_DIR
+
+INDEX_FILE = CONFIG_DIR / 'caption_index.npz'
+
+N_FEATURES = 2 ** 20
+
+_WORD = re.compile(r'\w+')
+
+
+def caption_features(text, n_features=N_FEATURES):
+    """Hashed ids of the word unigrams and bigrams of a caption.
+
+    crc32 is used rather than hash(), which is salted per process, so ids
+    stay valid in a saved index.
+    """
+    words = _WORD.findall(text.lower())
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    mask = n_features - 1
+    return [zlib.crc32(term.encode('utf-8')) & mask for term in terms]
+
+
+def vectorize(captions, n_features=N_FEATURES):
+    """CSR matrix of sublinear term frequencies, one row per caption"""
+    rows, columns = [], []
+    for row, text in enumerate(captions):
+        features = caption_features(text or "", n_features)
+        rows.extend([row] * len(features))
+        columns.extend(features)
+    counts = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64))),
+        shape=(len(captions), n_features)
+    )
+    counts.sum_duplicates()
+    counts.data = 1 + np.log(counts.data)
+    return counts
+
+
+class CaptionIndex:
+    """Hashed n-gram TF-IDF index of `latest_caption`, kept locally.
+
+    Rows store term frequencies only; document frequencies are kept
+    separately and IDF weights are applied at query time, so adding or
+    replacing captions never rewrites the existing rows. Sync compares
+    md5(latest_caption) per row and transfers only new or changed captions;
+    replaced rows are masked out and compacted away once they pile up.
+    A query is one sparse matrix-vector product over the whole index.
+    """
+
+    def __init__(self, connect, index_file=INDEX_FILE, n_features=N_FEATURES, fetch_size=2000,
+                 flush_size=100000):
+        self.connect = connect
+        self.index_file = index_file
+        self.n_features = n_features
+        self.fetch_size = fetch_size
+        self.flush_size = flush_size
+
+        self.lock = threading.Lock()
+        self.keys = np.empty(0, dtype=object)
+        self.digests = np.empty(0, dtype='S32')
+        self.alive = np.empty(0, dtype=bool)
+        self.matrix = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self.document_frequency = np.zeros(n_features, dtype=np.int64)
+        self.positions = {}
+        self.norm_cache = None
+        self.is_syncing = False
+        self.cancel_event = threading.Event()
+
+        self.load()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def load(self):
+        """Load index from file"""
+        if not self.index_file.exists():
+            return
+        try:
+            with np.load(self.index_file, allow_pickle=False) as data:
+                keys = data['keys'].astype(object)
+                digests = data['digests']
+                matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']),
+                                           shape=(len(keys), self.n_features))
+            alive = np.ones(len(keys), dtype=bool)
+            with self.lock:
+                self.keys = keys
+                self.digests = digests
+                self.alive = alive
+                self.matrix = matrix
+                self.document_frequency = np.bincount(matrix.indices, minlength=self.n_features)
+                self.positions = {key: i for i, key in enumerate(keys.tolist())}
+                self.norm_cache = None
+        except Exception as e:
+            print(f"Error loading caption index: {e}")
+
+    def save(self):
+        """Save index to file, without the rows of replaced captions"""
+        try:
+            CONFIG_DIR.mkdir(exist_ok=True, parents=True)
+            self.compact(threshold=0)
+            with self.lock:
+                keys, digests, matrix = self.keys, self.digests, self.matrix
+            tmp_file = self.index_file.with_suffix('.tmp.npz')
+            # Fixed-width unicode keys load without pickle
+            np.savez(tmp_file, keys=np.array(keys.tolist(), dtype=str), digests=digests,
+                     data=matrix.data, indices=matrix.indices, indptr=matrix.indptr)
+            tmp_file.replace(self.index_file)
+            return True
+        except Exception as e:
+            print(f"Error saving caption index: {e}")
+            return False
+
+    def compact(self, threshold=0.2):
+        """Drop masked rows once they make up more than `threshold` of the matrix"""
+        with self.lock:
+            dead = len(self.alive) - len(self.positions)
+            if not dead or dead <= threshold * len(self.alive):
+                return
+            keep = np.flatnonzero(self.alive)
+            self.keys = self.keys[keep]
+            self.digests = self.digests[keep]
+            self.matrix = self.matrix[keep]
+            self.alive = np.ones(len(keep), dtype=bool)
+            self.positions = {key: i for i, key in enumerate(self.keys.tolist())}
+            self.norm_cache = None
+
+    def _remove(self, keys):
+        """Mask out the rows of the given keys; caller holds the lock"""
+        rows = [self.positions.pop(key) for key in keys if key in self.positions]
+        if not rows:
+            return
+        rows = np.array(rows, dtype=np.int64)
+        self.alive[rows] = False
+        removed = self.matrix[rows]
+        self.document_frequency -= np.bincount(removed.indices, minlength=self.n_features)
+        self.norm_cache = None
+
+    def _append(self, keys, digests, matrix):
+        """Add rows for new or changed captions; caller holds the lock"""
+        start = len(self.keys)
+        self.keys = np.concatenate([self.keys, np.array(keys, dtype=object)])
+        self.digests = np.concatenate([self.digests, np.array(digests, dtype='S32')])
+        self.alive = np.concatenate([self.alive, np.ones(len(keys), dtype=bool)])
+        self.matrix = sparse.vstack([self.matrix, matrix], format='csr')
+        self.document_frequency += np.bincount(matrix.indices, minlength=self.n_features)
+        self.positions.update((key, start + i) for i, key in enumerate(keys))
+        self.norm_cache = None
+
+    def sync(self, progress=None):
+        """Bring the index up to date with the server.
+
+        `progress(done, total)` is called from the worker thread after each batch.
+        Returns (added_or_changed, removed), or None if cancelled.
+        """
+        if self.is_syncing:
+            return None
+
+        self.is_syncing = True
+        self.cancel_event.clear()
+        conn = None
+        try:
+            conn = self.connect()
+
+            cur = conn.cursor(name='mediabrowser_captions')
+            cur.itersize = 10000
+            cur.execute("""
+                SELECT abs_filename, md5(latest_caption)
+                FROM dm.col_images
+                WHERE latest_caption IS NOT NULL AND latest_caption <> ''
+            """)
+            server_digests = {key: digest.encode('ascii') for key, digest in cur}
+            cur.close()
+
+            with self.lock:
+                stale = [key for key in self.positions if key not in server_digests]
+                changed = [key for key, digest in server_digests.items()
+                           if key not in self.positions or self.digests[self.positions[key]] != digest]
+                self._remove(stale)
+
+            total = len(changed)
+            if progress:
+                progress(0, total)
+
+            # Batches are stacked onto the matrix in large chunks, each stack copies it
+            pending_keys, pending_matrices = [], []
+
+            def flush():
+                if not pending_keys:
+                    return
+                with self.lock:
+                    self._remove(pending_keys)
+                    self._append(list(pending_keys), [server_digests[key] for key in pending_keys],
+                                 sparse.vstack(pending_matrices, format='csr'))
+                pending_keys.clear()
+                pending_matrices.clear()
+
+            cur = conn.cursor()
+            done = 0
+            for start in range(0, total, self.fetch_size):
+                if self.cancel_event.is_set():
+                    break
+                cur.execute(
+                    "SELECT abs_filename, latest_caption FROM dm.col_images WHERE abs_filename = ANY(%s)",
+                    (changed[start:start + self.fetch_size],)
+                )
+                rows = [row for row in cur.fetchall() if row[0] in server_digests]
+                pending_keys.extend(key for key, _ in rows)
+                pending_matrices.append(vectorize([caption for _, caption in rows], self.n_features))
+                if len(pending_keys) >= self.flush_size:
+                    flush()
+                done += len(rows)
+                if progress:
+                    progress(done, total)
+            flush()
+            cur.close()
+
+            self.compact()
+            self.save()
+            if self.cancel_event.is_set():
+                return None
+            return done, len(stale)
+
+        finally:
+            if conn:
+                try:
+                    conn.close()
+                except:
+                    pass
+            self.is_syncing = False
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _weights(self):
+        """IDF weights and TF-IDF row norms for the current index"""
+        with self.lock:
+            if self.norm_cache is not None:
+                return self.norm_cache
+            matrix, alive = self.matrix, self.alive
+            document_count = len(self.positions)
+            idf = (np.log((1 + document_count) / (1 + self.document_frequency)) + 1).astype(np.float32)
+
+        squared = matrix.copy()
+        squared.data **= 2
+        norms = np.sqrt(squared @ (idf * idf))
+        norms[~alive] = np.inf
+        norms[norms == 0] = np.inf
+
+        with self.lock:
+            if self.matrix is matrix:
+                self.norm_cache = (idf, norms)
+        return idf, norms
+
+    def similar_to_text(self, text, limit=200, exclude=None):
+        """Return [(abs_filename, score)] of the captions most like `text`, best first"""
+        query = vectorize([text], self.n_features)
+        if not query.nnz:
+            return []
+
+        idf, norms = self._weights()
+        with self.lock:
+            matrix, keys = self.matrix, self.keys
+            excluded = self.positions.get(exclude) if exclude is not None else None
+        if norms.shape[0] != matrix.shape[0]:
+            return []
+
+        weights = query.data * idf[query.indices]
+        query_norm = np.sqrt(np.sum(weights * weights))
+        # x·idf · q·idf = x · (q·idf²): one sparse product over the whole index
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        vector[query.indices] = weights * idf[query.indices]
+        scores = (matrix @ vector) / (norms * query_norm)
+
+        if excluded is not None:
+            scores[excluded] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            best = np.argpartition(scores[candidates], len(candidates) - limit)[-limit:]
+            candidates = candidates[best]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(keys[i], float(scores[i])) for i in candidates]
@@ -0,0 +1,90 @@
+import argparse
+import base64
+import json
+import sys
+
+from config import Config
+from query_engine import ORDER_FILENAME, ORDER_TIMELINE, QueryEngine, SearchFilter
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stream matching rows of dm.col_images as JSON lines (no GUI required)."
+    )
+    parser.add_argument('search', nargs='?', default="",
+                        help="search text matched against caption, EXIF and filename")
+    parser.add_argument('--hide-no-preview', action='store_true',
+                        help="skip images without a preview")
+    parser.add_argument('--order', choices=(ORDER_FILENAME, ORDER_TIMELINE), default=ORDER_FILENAME,
+                        help="sort by filename (default) or EXIF capture date")
+    parser.add_argument('--limit', type=int, default=None,
+                        help="stop after this many rows")
+    parser.add_argument('--with-preview', action='store_true',
+                        help="include the preview blob, base64-encoded")
+    parser.add_argument('--fetch-size', type=int, default=500,
+                        help="rows per round-trip of the server-side cursor")
+    parser.add_argument('--count', action='store_true',
+                        help="print only the number of matching rows")
+
+    db_group = parser.add_argument_group("database (defaults come from ~/.mediabrowser/config.json)")
+    db_group.add_argument('--host')
+    db_group.add_argument('--port')
+    db_group.add_argument('--database')
+    db_group.add_argument('--user')
+    db_group.add_argument('--password')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    db_config = dict(Config().db_config)
+    for key in ('host', 'port', 'database', 'user', 'password'):
+        value = getattr(args, key)
+        if value is not None:
+            db_config[key] = value
+
+    engine = QueryEngine(db_config)
+    search_filter = SearchFilter(args.search, args.hide_no_preview)
+
+    try:
+        if args.count:
+            engine.connect()
+            print(engine.count(search_filter))
+            return 0
+
+        columns = "abs_filename, rel_filename, latest_caption, exif"
+        if args.with_preview:
+            columns += ", preview"
+
+        out = sys.stdout
+        written = 0
+        for row in engine.iter_rows(search_filter, columns=columns, order=args.order,
+                                    fetch_size=args.fetch_size):
+            record = {
+                'abs_filename': row[0],
+                'rel_filename': row[1],
+                'caption': row[2],
+                'exif': row[3],
+            }
+            if args.with_preview:
+                record['preview'] = base64.b64encode(row[4]).decode('ascii') if row[4] is not None else None
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+            written += 1
+            if args.limit is not None and written >= args.limit:
+                break
+        out.flush()
+        return 0
+
+    except BrokenPipeError:
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,13 @@
 import json
+import os
 from pathlib import Path
 
-CONFIG_DIR = Path.home() / '.mediabrowser'
+# MEDIABROWSER_HOME points everything at another directory, e.g. for replays with cold caches
+CONFIG_DIR = Path(os.environ.get('MEDIABROWSER_HOME') or Path.home() / '.mediabrowser')
 CONFIG_FILE = CONFIG_DIR / 'config.json'
 
+PRIMARY_SOURCE = 'Primary'
+
 
 class Config:
     def __init__(self):
@@ -16,6 +20,10 @@ class Config:
             "password": ""
         }
 
+        # Additional collection databases, queried together with db_config:
+        # [{"name": "...", "db_config": {...}}]
+        self.sources = []
+
         # Simple disk label (just the label, not mapping)
         self.disk_label = "X:"
 
@@ -29,6 +37,7 @@ class Config:
                     data = json.load(f)
                     self.db_config = data.get('db_config', self.db_config)
                     self.disk_label = data.get('disk_label', self.disk_label)
+                    self.sources = data.get('sources', self.sources)
             except Exception as e:
                 print(f"Error loading config: {e}")
                 try:
@@ -37,13 +46,18 @@ class Config:
                 except:
                     pass
 
+    def all_sources(self):
+        """The primary database followed by the additional sources"""
+        return [{'name': PRIMARY_SOURCE, 'db_config': self.db_config}] + list(self.sources)
+
     def save(self):
         """Save configuration to file"""
         try:
             CONFIG_DIR.mkdir(exist_ok=True, parents=True)
             data = {
                 'db_config': self.db_config,
-                'disk_label': self.disk_label
+                'disk_label': self.disk_label,
+                'sources': self.sources
             }
             with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
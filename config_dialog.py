@@ -3,6 +3,8 @@ from tkinter import ttk, messagebox
 import psycopg2
 from psycopg2 import OperationalError, Error
 
+from config import PRIMARY_SOURCE
+
 class ConfigDialog:
     def __init__(self, parent, config):
         self.parent = parent
@@ -28,6 +30,11 @@ class ConfigDialog:
         notebook.add(db_frame, text="Database")
         self.create_database_tab(db_frame)
 
+        # Additional sources tab
+        sources_frame = ttk.Frame(notebook)
+        notebook.add(sources_frame, text="Sources")
+        self.create_sources_tab(sources_frame)
+
         # Disk tab
         disk_frame = ttk.Frame(notebook)
         notebook.add(disk_frame, text="Disk")
@@ -105,6 +112,73 @@ class ConfigDialog:
         for i in range(row):
             frame.rowconfigure(i, weight=1)
 
+    def create_sources_tab(self, parent):
+        """Create additional sources tab"""
+        frame = ttk.LabelFrame(parent, text="Additional Collection Databases", padding=10)
+        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        self.sources = [dict(source, db_config=dict(source['db_config'])) for source in self.config.sources]
+
+        self.sources_listbox = tk.Listbox(frame, height=8, width=20, exportselection=False)
+        self.sources_listbox.grid(row=0, column=0, rowspan=7, sticky=tk.NS, padx=(0, 10))
+        self.sources_listbox.bind('<<ListboxSelect>>', self.on_source_select)
+        for source in self.sources:
+            self.sources_listbox.insert(tk.END, source['name'])
+
+        self.source_vars = {}
+        fields = [('name', "Name:"), ('host', "Host/IP:"), ('port', "Port:"),
+                  ('database', "Database Name:"), ('user', "Username:"), ('password', "Password:")]
+        for row, (key, label) in enumerate(fields):
+            ttk.Label(frame, text=label).grid(row=row, column=1, sticky=tk.W, pady=2)
+            var = tk.StringVar(value='5432' if key == 'port' else '')
+            ttk.Entry(frame, textvariable=var, width=25,
+                      show="*" if key == 'password' else "").grid(row=row, column=2, padx=5, pady=2, sticky=tk.W)
+            self.source_vars[key] = var
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=len(fields), column=1, columnspan=2, sticky=tk.W, pady=5)
+        ttk.Button(button_frame, text="Add / Update", command=self.add_source).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, text="Remove", command=self.remove_source).pack(side=tk.LEFT, padx=2)
+
+        frame.columnconfigure(2, weight=1)
+
+    def on_source_select(self, event=None):
+        selection = self.sources_listbox.curselection()
+        if not selection:
+            return
+        source = self.sources[selection[0]]
+        self.source_vars['name'].set(source['name'])
+        for key in ('host', 'port', 'database', 'user', 'password'):
+            self.source_vars[key].set(source['db_config'].get(key, ''))
+
+    def add_source(self):
+        name = self.source_vars['name'].get().strip()
+        if not name or name == PRIMARY_SOURCE:
+            messagebox.showwarning("Invalid Source", f"Source name must be set and differ from '{PRIMARY_SOURCE}'",
+                                   parent=self.dialog)
+            return
+
+        source = {
+            'name': name,
+            'db_config': {key: self.source_vars[key].get().strip()
+                          for key in ('host', 'port', 'database', 'user')}
+        }
+        source['db_config']['password'] = self.source_vars['password'].get()
+
+        names = [existing['name'] for existing in self.sources]
+        if name in names:
+            self.sources[names.index(name)] = source
+        else:
+            self.sources.append(source)
+            self.sources_listbox.insert(tk.END, name)
+
+    def remove_source(self):
+        selection = self.sources_listbox.curselection()
+        if not selection:
+            return
+        del self.sources[selection[0]]
+        self.sources_listbox.delete(selection[0])
+
     def create_disk_tab(self, parent):
         """Create disk configuration tab"""
         frame = ttk.LabelFrame(parent, text="Disk Settings", padding=10)
@@ -191,6 +265,8 @@ class ConfigDialog:
             'password': self.password_var.get()
         }
 
+        self.config.sources = self.sources
+
         # Update disk label
         disk_label = self.disk_label_var.get().strip()
         if disk_label:
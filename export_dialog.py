@@ -0,0 +1,129 @@
+import threading
+import tkinter as tk
+from tkinter import ttk, filedialog
+
+from exporter import ResultExporter
+
+
+class ExportDialog:
+    def __init__(self, parent, connect, where_clause, params, description):
+        self.parent = parent
+        self.connect = connect
+        self.where_clause = where_clause
+        self.params = params
+        self.description = description
+        self.dialog = None
+        self.exporter = None
+
+    def show(self):
+        """Show export dialog"""
+        self.dialog = tk.Toplevel(self.parent)
+        self.dialog.title("Export Results")
+        self.dialog.geometry("600x250")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(self.parent)
+        self.dialog.protocol("WM_DELETE_WINDOW", self.close)
+
+        frame = ttk.Frame(self.dialog, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(frame, text=f"Export: {self.description}").grid(row=0, column=0, columnspan=3, sticky=tk.W, pady=5)
+
+        # Target
+        ttk.Label(frame, text="Target:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.target_var = tk.StringVar()
+        ttk.Entry(frame, textvariable=self.target_var, width=50).grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
+
+        browse_frame = ttk.Frame(frame)
+        browse_frame.grid(row=1, column=2, sticky=tk.W)
+        ttk.Button(browse_frame, text="Folder...", command=self.browse_folder).pack(side=tk.LEFT)
+        ttk.Button(browse_frame, text="ZIP...", command=self.browse_zip).pack(side=tk.LEFT, padx=5)
+
+        # Manifest format
+        ttk.Label(frame, text="Manifest:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.format_var = tk.StringVar(value="jsonl")
+        ttk.Combobox(frame, textvariable=self.format_var, values=("jsonl", "csv"),
+                     state="readonly", width=8).grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
+
+        # Progress
+        self.progress = ttk.Progressbar(frame, mode='determinate', length=550)
+        self.progress.grid(row=3, column=0, columnspan=3, pady=10, sticky=tk.EW)
+
+        self.info_label = ttk.Label(frame, text="")
+        self.info_label.grid(row=4, column=0, columnspan=3, sticky=tk.W)
+
+        # Buttons
+        button_frame = ttk.Frame(self.dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+
+        self.close_button = ttk.Button(button_frame, text="Close", command=self.close)
+        self.close_button.pack(side=tk.RIGHT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_export, state="disabled")
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        self.start_button = ttk.Button(button_frame, text="Export", command=self.start_export)
+        self.start_button.pack(side=tk.RIGHT, padx=5)
+
+    def browse_folder(self):
+        path = filedialog.askdirectory(parent=self.dialog, title="Export to folder")
+        if path:
+            self.target_var.set(path)
+
+    def browse_zip(self):
+        path = filedialog.asksaveasfilename(parent=self.dialog, title="Export to ZIP",
+                                            defaultextension=".zip", filetypes=[("ZIP archive", "*.zip")])
+        if path:
+            self.target_var.set(path)
+
+    def start_export(self):
+        target = self.target_var.get().strip()
+        if not target:
+            self.info_label.config(text="Choose a target folder or ZIP file", foreground="red")
+            return
+
+        self.exporter = ResultExporter(self.connect, self.where_clause, self.params,
+                                       target, manifest_format=self.format_var.get())
+        self.start_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.info_label.config(text="Counting rows...", foreground="")
+
+        def progress(done, total):
+            self.parent.after(0, self.update_progress, done, total)
+
+        def export_in_thread():
+            try:
+                exported = self.exporter.run(progress)
+                if self.exporter.cancel_event.is_set():
+                    message = f"Cancelled after {exported} rows"
+                else:
+                    message = f"Exported {exported} rows to {target}"
+                if self.exporter.errors:
+                    message += f" ({len(self.exporter.errors)} write errors)"
+                self.parent.after(0, self.finish_export, message, "green")
+            except Exception as e:
+                self.parent.after(0, self.finish_export, f"Export failed: {str(e)}", "red")
+
+        threading.Thread(target=export_in_thread, daemon=True).start()
+
+    def update_progress(self, done, total):
+        if not self.dialog.winfo_exists():
+            return
+        self.progress.config(maximum=max(total, 1), value=done)
+        self.info_label.config(text=f"{done} / {total} rows")
+
+    def finish_export(self, message, color):
+        self.exporter = None
+        if not self.dialog.winfo_exists():
+            return
+        self.start_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.info_label.config(text=message, foreground=color)
+
+    def cancel_export(self):
+        if self.exporter:
+            self.exporter.cancel()
+            self.info_label.config(text="Cancelling...")
+
+    def close(self):
+        if self.exporter:
+            self.exporter.cancel()
+        self.dialog.destroy()
@@ -0,0 +1,220 @@
+import csv
+import json
+import os
+import queue
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+MANIFEST_FIELDS = ('abs_filename', 'rel_filename', 'preview_file', 'caption', 'exif')
+
+
+def preview_extension(data):
+    """Guess a file extension from the first bytes of a preview blob"""
+    if data[:3] == b'\xff\xd8\xff':
+        return '.jpg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return '.png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return '.gif'
+    return '.bin'
+
+
+def preview_path(rel_filename, data):
+    """Relative path of an exported preview, mirroring rel_filename"""
+    parts = [part for part in PurePosixPath(rel_filename.replace('\\', '/')).parts
+             if part not in ('', '.', '..', '/') and not part.endswith(':')]
+    if not parts:
+        parts = ['unnamed']
+    return str(PurePosixPath('previews', *parts)) + preview_extension(data)
+
+
+class _FolderWriter:
+    """Writes previews into a folder on a thread pool with a bounded backlog"""
+
+    def __init__(self, root, workers):
+        self.root = Path(root)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.errors = []
+
+    def write(self, name, data):
+        self.slots.acquire()
+        future = self.pool.submit(self._write, name, data)
+        future.add_done_callback(lambda f: self.slots.release())
+
+    def _write(self, name, data):
+        try:
+            path = self.root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        except Exception as e:
+            self.errors.append(f"{name}: {e}")
+
+    def close(self, manifest_name=None, manifest_path=None):
+        self.pool.shutdown(wait=True)
+        if manifest_path:
+            os.replace(manifest_path, self.root / manifest_name)
+
+
+class _ZipWriter:
+    """Writes previews into a ZIP archive from a single writer thread.
+
+    zipfile cannot take concurrent writes, so fetching and writing overlap
+    through a bounded queue instead.
+    """
+
+    def __init__(self, path, workers):
+        self.zip_file = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+        self.queue = queue.Queue(maxsize=workers * 2)
+        self.errors = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, name, data):
+        self.queue.put((name, data))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            name, data = item
+            try:
+                self.zip_file.writestr(name, data)
+            except Exception as e:
+                self.errors.append(f"{name}: {e}")
+
+    def close(self, manifest_name=None, manifest_path=None):
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            if manifest_path:
+                self.zip_file.write(manifest_path, manifest_name, compress_type=zipfile.ZIP_DEFLATED)
+                os.remove(manifest_path)
+        finally:
+            self.zip_file.close()
+
+
+class ResultExporter:
+    """Streams a filtered result set into a folder or ZIP with a manifest.
+
+    Rows come from a server-side cursor on a dedicated connection, so memory
+    use depends on `fetch_size` and the writer backlog, not on the row count.
+    """
+
+    def __init__(self, connect, where_clause, params, target, manifest_format='jsonl',
+                 workers=4, fetch_size=200):
+        self.connect = connect
+        self.where_clause = where_clause
+        self.params = list(params)
+        self.target = Path(target)
+        self.manifest_format = manifest_format
+        self.workers = workers
+        self.fetch_size = fetch_size
+        self.cancel_event = threading.Event()
+        self.errors = []
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def is_zip(self):
+        return self.target.suffix.lower() == '.zip'
+
+    def run(self, progress=None):
+        """Export all matching rows.
+
+        `progress(done, total)` is called from the calling thread after each batch.
+        Returns the number of exported rows; stops early if cancelled.
+        """
+        conn = self.connect()
+        writer = None
+        manifest_path = None
+        exported = 0
+        try:
+            cur = conn.cursor()
+            cur.execute(f"SELECT count(*) FROM dm.col_images {self.where_clause}", self.params)
+            total = cur.fetchone()[0]
+            cur.close()
+            if progress:
+                progress(0, total)
+
+            if self.is_zip:
+                self.target.parent.mkdir(parents=True, exist_ok=True)
+                writer = _ZipWriter(self.target, self.workers)
+                manifest_dir = self.target.parent
+            else:
+                self.target.mkdir(parents=True, exist_ok=True)
+                writer = _FolderWriter(self.target, self.workers)
+                manifest_dir = self.target
+
+            manifest_name = f"manifest.{self.manifest_format}"
+            fd, manifest_path = tempfile.mkstemp(prefix='.manifest-', dir=manifest_dir)
+            with open(fd, 'w', encoding='utf-8', newline='') as manifest:
+                if self.manifest_format == 'csv':
+                    csv_writer = csv.DictWriter(manifest, fieldnames=MANIFEST_FIELDS)
+                    csv_writer.writeheader()
+
+                cur = conn.cursor(name='mediabrowser_export')
+                cur.itersize = self.fetch_size
+                cur.execute(f"""
+                    SELECT abs_filename, rel_filename, preview, latest_caption, exif
+                    FROM dm.col_images
+                    {self.where_clause}
+                    ORDER BY rel_filename desc
+                """, self.params)
+
+                while not self.cancel_event.is_set():
+                    rows = cur.fetchmany(self.fetch_size)
+                    if not rows:
+                        break
+
+                    for abs_filename, rel_filename, preview, caption, exif in rows:
+                        preview_file = None
+                        if preview is not None:
+                            data = bytes(preview)
+                            preview_file = preview_path(rel_filename or abs_filename, data)
+                            writer.write(preview_file, data)
+
+                        record = {
+                            'abs_filename': abs_filename,
+                            'rel_filename': rel_filename,
+                            'preview_file': preview_file,
+                            'caption': caption,
+                            'exif': exif,
+                        }
+                        if self.manifest_format == 'csv':
+                            record['exif'] = json.dumps(exif, ensure_ascii=False) if exif else ''
+                            csv_writer.writerow(record)
+                        else:
+                            manifest.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+                    exported += len(rows)
+                    if progress:
+                        progress(exported, total)
+
+                cur.close()
+
+            finished_writer, writer = writer, None
+            finished_writer.close(manifest_name, manifest_path)
+            self.errors.extend(finished_writer.errors)
+            return exported
+
+        finally:
+            if writer:
+                try:
+                    writer.close()
+                except:
+                    pass
+            if manifest_path and os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            try:
+                conn.close()
+            except:
+                pass
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from query_engine import FACET_FOLDER, FACET_SQL, add_condition
+
+FACET_LABELS = {
+    'camera': "Camera",
+    'lens': "Lens",
+    'year': "Year",
+    FACET_FOLDER: "Folder",
+}
+FACET_ORDER = ('camera', 'lens', 'year', FACET_FOLDER)
+
+
+class FacetCounter:
+    """Value counts per facet for a filter, from server-side GROUP BY queries.
+
+    Each facet is counted with its own selection left out, so the other
+    values stay visible for switching; the folder facet instead lists the
+    subfolders of the selected folder. Every facet of every source is
+    counted concurrently on its own dedicated autocommit connection, never
+    on the pool that page loads use, and counts from several sources are
+    summed per value, like the merged list they filter. Each source only
+    reports its `limit` largest values, so a value outside the top of some
+    source is undercounted there. `cancel` aborts a computation that a newer
+    filter has made obsolete. Results are kept in a bounded in-memory LRU
+    keyed by the sources and the filter state.
+    """
+
+    def __init__(self, engines, max_entries=64, max_age=600, limit=50):
+        self.engines = engines
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.query_lock = threading.Lock()
+        self.connections = {}
+        self.generation = 0
+
+    def key(self, search_filter, engines):
+        return tuple(sorted(engines)), search_filter.key()
+
+    def cached(self, search_filter, refresh=False):
+        """Return cached counts for the filter, or None"""
+        if refresh:
+            return None
+        key = self.key(search_filter, self.engines())
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[0] >= self.max_age:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def get(self, search_filter, refresh=False):
+        """Return {facet: [(value, count)]}, or None if cancelled by a newer request"""
+        counts = self.cached(search_filter, refresh)
+        if counts is not None:
+            return counts
+
+        generation = self.generation
+        engines = self.engines()
+        tasks = [(source, name) for source in engines for name in FACET_ORDER]
+        with self.query_lock:
+            if generation != self.generation:
+                return None
+            with ThreadPoolExecutor(max_workers=max(len(tasks), 1)) as executor:
+                futures = {(source, name): executor.submit(self.count_facet, engines[source], source,
+                                                           search_filter, name)
+                           for source, name in tasks}
+                try:
+                    results = {task: future.result() for task, future in futures.items()}
+                except psycopg2.extensions.QueryCanceledError:
+                    return None
+                except psycopg2.Error:
+                    # Stop the other queries before closing their connections
+                    self.cancel_queries()
+                    executor.shutdown(wait=True)
+                    self.close()
+                    raise
+            if generation != self.generation:
+                return None
+
+        counts = {}
+        for name in FACET_ORDER:
+            totals = {}
+            for source in engines:
+                for value, count in results[(source, name)]:
+                    totals[value] = totals.get(value, 0) + count
+            # Same order as the queries: count descending, then value with NULL last
+            ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0] is None, item[0] or ''))
+            counts[name] = ranked[:self.limit]
+
+        key = self.key(search_filter, engines)
+        with self.lock:
+            self.entries[key] = (time.time(), counts)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return counts
+
+    def connection(self, engine, source, name):
+        """Dedicated connection for one facet of one source"""
+        with self.lock:
+            conn = self.connections.get((source, name))
+        if conn is None or conn.closed:
+            conn = engine.create_connection()
+            conn.autocommit = True
+            with self.lock:
+                self.connections[(source, name)] = conn
+        return conn
+
+    def count_facet(self, engine, source, search_filter, name):
+        if name == FACET_FOLDER:
+            prefix = search_filter.facets.get(FACET_FOLDER)
+            start = len(prefix) + 2 if prefix else 1
+            where_clause, params = search_filter.where_clause()
+            # Only rows below a subfolder count; files directly in the folder have no next component
+            where_clause = add_condition(where_clause, "strpos(substr(rel_filename, %s), '/') > 0")
+            value_sql = "split_part(substr(rel_filename, %s), '/', 1)"
+            params = [start] + params + [start, self.limit]
+        else:
+            where_clause, params = search_filter.without_facet(name).where_clause()
+            value_sql = FACET_SQL[name]
+            params = params + [self.limit]
+
+        cur = self.connection(engine, source, name).cursor()
+        try:
+            cur.execute(f"""
+                SELECT {value_sql} AS value, count(*)
+                FROM dm.col_images
+                {where_clause}
+                GROUP BY 1
+                ORDER BY 2 DESC, 1
+                LIMIT %s
+            """, params)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+
+        if name == FACET_FOLDER:
+            prefix = search_filter.facets.get(FACET_FOLDER)
+            return [(f"{prefix}/{value}" if prefix else value, count) for value, count in rows]
+        return [(value, count) for value, count in rows]
+
+    def cancel(self):
+        """Abandon the computation in progress, if any"""
+        self.generation += 1
+        self.cancel_queries()
+
+    def cancel_queries(self):
+        with self.lock:
+            connections = list(self.connections.values())
+        for conn in connections:
+            if not conn.closed:
+                try:
+                    conn.cancel()
+                except psycopg2.Error:
+                    pass
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = self.connections, {}
+        for conn in connections.values():
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -0,0 +1,132 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from query_engine import ORDER_FILENAME, QueryEngine
+
+
+class FanOutEngine:
+    """One QueryEngine per configured source, queried concurrently.
+
+    Every source keeps its own connection pool, and each round of queries
+    runs on a thread per source, so a round takes as long as the slowest
+    source rather than the sum of all of them.
+    """
+
+    def __init__(self, sources, engines=None):
+        self.engines = {}
+        for source in sources:
+            name = source['name']
+            if engines and name in engines:
+                self.engines[name] = engines[name]
+            else:
+                self.engines[name] = QueryEngine(source['db_config'])
+        self.errors = {}
+        self.executor = ThreadPoolExecutor(max_workers=max(len(self.engines), 1))
+
+    @property
+    def names(self):
+        return list(self.engines)
+
+    @property
+    def connected_names(self):
+        return [name for name, engine in self.engines.items() if engine.is_connected]
+
+    def map(self, function, names=None):
+        """Run function(name, engine) for each source concurrently; returns {name: result}.
+
+        Exceptions are stored in `errors` instead of being raised, so one
+        unreachable site does not hide the others.
+        """
+        names = self.connected_names if names is None else names
+        futures = {name: self.executor.submit(function, name, self.engines[name]) for name in names}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+                self.errors.pop(name, None)
+            except Exception as e:
+                self.errors[name] = str(e)
+        return results
+
+    def connect(self):
+        """Connect every source that is not connected yet, concurrently; returns the connected names"""
+        pending = [name for name, engine in self.engines.items() if not engine.is_connected]
+        self.map(lambda name, engine: engine.connect(), pending)
+        return self.connected_names
+
+    def close(self, keep=None):
+        """Close all sources except the engine passed as `keep`"""
+        for engine in self.engines.values():
+            if engine is not keep:
+                engine.close()
+        self.executor.shutdown(wait=False)
+
+    def pager(self, search_filter, order=ORDER_FILENAME, cursor=None):
+        return MergedPager(self, search_filter, order, cursor)
+
+
+class MergedPager:
+    """Merges per-source seek pages into one stream ordered by the sort key.
+
+    Each source pages independently from its own seek cursor, and rows a page
+    did not use stay buffered for the next one, so every row is returned
+    exactly once and in order. Before a page is merged, all sources whose
+    buffer is shorter than the page are topped up in one concurrent round.
+
+    Rows are compared in Python. Sources are asked for code point order
+    (COLLATE "C"), which matches Python's string comparison, so the merged
+    stream is in one global order.
+    """
+
+    def __init__(self, fanout, search_filter, order=ORDER_FILENAME, cursor=None):
+        self.fanout = fanout
+        self.search_filter = search_filter
+        self.order = order
+        self.buffers = {name: deque() for name in fanout.connected_names}
+        self.cursors = {name: cursor for name in self.buffers}
+        self.exhausted = set()
+
+    @property
+    def has_more(self):
+        return any(self.buffers[name] or name not in self.exhausted for name in self.buffers)
+
+    def fill(self, page_size):
+        needed = {name: page_size - len(buffer) for name, buffer in self.buffers.items()
+                  if name not in self.exhausted and len(buffer) < page_size}
+        if not needed:
+            return
+
+        def fetch(name, engine):
+            return engine.fetch_keyed_page(self.search_filter, limit=needed[name], order=self.order,
+                                           cursor=self.cursors[name], code_point_order=True)
+
+        results = self.fanout.map(fetch, list(needed))
+        for name, limit in needed.items():
+            if name not in results:
+                # Failed source: stop paging it, the error is in fanout.errors
+                self.exhausted.add(name)
+                continue
+            keyed_rows = results[name]
+            if len(keyed_rows) < limit:
+                self.exhausted.add(name)
+            if keyed_rows:
+                self.cursors[name] = keyed_rows[-1][0]
+            self.buffers[name].extend(keyed_rows)
+
+    def next_page(self, page_size):
+        """Return up to page_size (source_name, row) pairs in global order"""
+        self.fill(page_size)
+
+        page = []
+        while len(page) < page_size:
+            best_name = None
+            best_key = None
+            for name, buffer in self.buffers.items():
+                if buffer and (best_key is None or buffer[0][0] > best_key):
+                    best_name = name
+                    best_key = buffer[0][0]
+            if best_name is None:
+                break
+            _, row = self.buffers[best_name].popleft()
+            page.append((best_name, row))
+        return page
@@ -0,0 +1,189 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from config import CONFIG_DIR
+
+
+def normalize_rel_path(rel_filename):
+    """Key used for lookups: forward slashes, no leading separator, case-folded on Windows"""
+    key = rel_filename.replace('\\', '/').lstrip('/')
+    if os.name == 'nt':
+        key = key.casefold()
+    return key
+
+
+class FileAvailabilityIndex:
+    """Set of relative paths that exist under the disk root.
+
+    The root is walked with os.scandir on a thread pool, one directory per
+    task, which keeps many slow network round-trips in flight at once.
+    Every directory is stored with its mtime, which changes whenever an
+    entry is added, removed or renamed in it, so a rescan only lists the
+    directories that changed and merely stats the rest. The result is
+    cached in ~/.mediabrowser; lookups are plain set membership tests and
+    are authoritative except for misses while a scan is running.
+    """
+
+    def __init__(self, disk_label, workers=16):
+        self.disk_label = disk_label
+        self.root = disk_label.rstrip('\\/') + os.sep
+        self.workers = workers
+        safe_label = re.sub(r'[^A-Za-z0-9_-]+', '_', disk_label).strip('_') or 'root'
+        self.index_file = CONFIG_DIR / f'file_index_{safe_label}.json.gz'
+
+        self.paths = None
+        self.directories = {}
+        self.scanned_at = None
+        self.is_available = True
+        self.is_scanning = False
+        self.cancel_event = threading.Event()
+
+        self.load()
+
+    @property
+    def is_ready(self):
+        return self.paths is not None
+
+    def __len__(self):
+        return len(self.paths) if self.paths is not None else 0
+
+    def contains(self, rel_filename):
+        """True/False if the file is known to exist or not, None while that is unknown.
+
+        Misses are unknown while a scan may still find the file. When the disk
+        root was not reachable at the last scan every file counts as missing.
+        """
+        paths = self.paths
+        if paths is None:
+            return None
+        if not self.is_available:
+            return False
+        if normalize_rel_path(rel_filename) in paths:
+            return True
+        return None if self.is_scanning else False
+
+    def add(self, rel_filename):
+        """Record a file confirmed to exist on disk"""
+        if self.paths is not None:
+            self.paths.add(normalize_rel_path(rel_filename))
+
+    @staticmethod
+    def _paths_of(directories):
+        return {normalize_rel_path(rel_dir + name)
+                for rel_dir, (_, _, files) in directories.items() for name in files}
+
+    def load(self):
+        """Load index from file"""
+        if not self.index_file.exists():
+            return
+        try:
+            with gzip.open(self.index_file, 'rt', encoding='utf-8') as f:
+                directories = {rel_dir: tuple(entry) for rel_dir, entry in json.load(f).items()}
+            self.scanned_at = self.index_file.stat().st_mtime
+            self.directories = directories
+            self.paths = self._paths_of(directories)
+        except Exception as e:
+            print(f"Error loading file index: {e}")
+
+    def save(self, directories):
+        """Save index to file"""
+        try:
+            CONFIG_DIR.mkdir(exist_ok=True, parents=True)
+            tmp_file = self.index_file.with_suffix('.tmp')
+            with gzip.open(tmp_file, 'wt', encoding='utf-8', compresslevel=1) as f:
+                json.dump(directories, f, ensure_ascii=False, separators=(',', ':'))
+            tmp_file.replace(self.index_file)
+            return True
+        except Exception as e:
+            print(f"Error saving file index: {e}")
+            return False
+
+    def scan(self, progress=None):
+        """Bring the index up to date with the disk.
+
+        Directories whose mtime is unchanged since the last scan are not
+        listed again. `progress(files, directories)` is called from the worker
+        thread every second or so. Returns the number of files found, or None
+        if the root is not reachable or the scan was cancelled.
+        """
+        if self.is_scanning:
+            return None
+        if not os.path.isdir(self.root):
+            self.is_available = False
+            return None
+
+        self.is_scanning = True
+        self.is_available = True
+        self.cancel_event.clear()
+        try:
+            known = self.directories
+            directories = {}
+            files_found = 0
+            last_report = time.monotonic()
+
+            def scan_directory(rel_dir):
+                path = self.root + rel_dir
+                try:
+                    # Taken before listing, so a change made meanwhile shows up next time
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    return rel_dir, None
+                entry = known.get(rel_dir)
+                if entry is not None and entry[0] == mtime:
+                    return rel_dir, entry
+
+                files = []
+                subdirs = []
+                try:
+                    with os.scandir(path) as entries:
+                        for dir_entry in entries:
+                            try:
+                                if dir_entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(dir_entry.name)
+                                elif dir_entry.is_file():
+                                    files.append(dir_entry.name)
+                            except OSError:
+                                pass
+                except OSError as e:
+                    print(f"Error scanning {path}: {e}")
+                    return rel_dir, None
+                return rel_dir, (mtime, subdirs, files)
+
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                pending = {pool.submit(scan_directory, '')}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    if self.cancel_event.is_set():
+                        for future in pending:
+                            future.cancel()
+                        return None
+
+                    for future in done:
+                        rel_dir, entry = future.result()
+                        if entry is None:
+                            continue
+                        directories[rel_dir] = entry
+                        files_found += len(entry[2])
+                        pending.update(pool.submit(scan_directory, f"{rel_dir}{name}/") for name in entry[1])
+
+                    if progress and time.monotonic() - last_report > 1:
+                        last_report = time.monotonic()
+                        progress(files_found, len(directories))
+
+            paths = self._paths_of(directories)
+            self.directories = directories
+            self.paths = paths
+            self.scanned_at = time.time()
+            self.save(directories)
+            return len(paths)
+
+        finally:
+            self.is_scanning = False
+
+    def cancel(self):
+        self.cancel_event.set()
@@ -0,0 +1,70 @@
+from tile_viewer import ByteLRU
+
+FOLDER_PREFIX = 'dir:'
+MORE_PREFIX = 'more:'
+PLACEHOLDER_PREFIX = 'load:'
+
+ROW_OVERHEAD = 256
+
+
+def folder_iid(prefix):
+    """Tree item id of the folder whose rows start with `prefix` ('a/b/')"""
+    return FOLDER_PREFIX + prefix
+
+
+def prefix_of(iid):
+    """Folder prefix of a 'dir:', 'more:' or 'load:' tree item"""
+    for marker in (FOLDER_PREFIX, MORE_PREFIX, PLACEHOLDER_PREFIX):
+        if iid.startswith(marker):
+            return iid[len(marker):]
+    return None
+
+
+def is_folder_item(iid):
+    return prefix_of(iid) is not None
+
+
+def listing_size(listing):
+    return sum(ROW_OVERHEAD + len(row[2] or b'') for row in listing['files']) + ROW_OVERHEAD * len(listing['folders'])
+
+
+class FolderCache:
+    """Folder listings for the folder tree, loaded one folder at a time.
+
+    A listing holds the immediate subfolders with their counts and the files
+    directly in the folder, a page at a time. Listings are cached per filter
+    state and folder in a byte-capped LRU, since file rows carry previews.
+    """
+
+    def __init__(self, engine, page_size=200, max_bytes=256 * 1024 * 1024):
+        self.engine = engine
+        self.page_size = page_size
+        self.cache = ByteLRU(max_bytes)
+
+    def listing(self, search_filter, prefix):
+        """Return {'folders': [(name, count)], 'files': [rows], 'has_more': bool}"""
+        key = (search_filter.key(), prefix)
+        listing = self.cache.get(key)
+        if listing is not None:
+            return listing
+
+        folders = self.engine.fetch_subfolders(search_filter, prefix)
+        files = self.engine.fetch_folder_files(search_filter, prefix, limit=self.page_size)
+        listing = {'folders': folders, 'files': files, 'has_more': len(files) == self.page_size}
+        self.cache.put(key, listing, listing_size(listing))
+        return listing
+
+    def more_files(self, search_filter, prefix, after):
+        """Load the files of a folder that follow the rel_filename `after`; returns (rows, has_more)"""
+        rows = self.engine.fetch_folder_files(search_filter, prefix, limit=self.page_size, after=after)
+        has_more = len(rows) == self.page_size
+
+        key = (search_filter.key(), prefix)
+        listing = self.cache.get(key)
+        if listing is not None and listing['files'] and listing['files'][-1][1] == after:
+            listing = {'folders': listing['folders'], 'files': listing['files'] + rows, 'has_more': has_more}
+            self.cache.put(key, listing, listing_size(listing))
+        return rows, has_more
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,270 @@
+import json
+import math
+import re
+import threading
+
+import numpy as np
+
+from config import CONFIG_DIR
+
+INDEX_FILE = CONFIG_DIR / 'gps_index.npz'
+
+EARTH_RADIUS_KM = 6371.0088
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?(?:/-?\d+(?:\.\d+)?)?')
+
+
+def _dms_to_degrees(text):
+    """'[55, 45, 2103/100]' -> 55.75583; None if the value cannot be read"""
+    if text is None:
+        return None
+    values = []
+    for part in _NUMBER.findall(str(text))[:3]:
+        if '/' in part:
+            numerator, denominator = part.split('/')
+            if float(denominator) == 0:
+                return None
+            values.append(float(numerator) / float(denominator))
+        else:
+            values.append(float(part))
+    if not values:
+        return None
+    degrees = 0.0
+    for value, scale in zip(values, (1, 60, 3600)):
+        degrees += value / scale
+    return degrees
+
+
+def decimal_coordinates(latitude, latitude_ref, longitude, longitude_ref):
+    """Decimal (lat, lon) from EXIF degree/minute/second strings, or None"""
+    lat = _dms_to_degrees(latitude)
+    lon = _dms_to_degrees(longitude)
+    if lat is None or lon is None:
+        return None
+    if str(latitude_ref or '').strip().upper().startswith('S'):
+        lat = -lat
+    if str(longitude_ref or '').strip().upper().startswith('W'):
+        lon = -lon
+    # Receivers without a fix often write zeros
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None
+    return lat, lon
+
+
+def gps_from_exif(exif_json):
+    """Decimal (lat, lon) of an EXIF dict or JSON string, or None"""
+    if not exif_json:
+        return None
+    try:
+        exif = json.loads(exif_json) if isinstance(exif_json, str) else exif_json
+    except ValueError:
+        return None
+    return decimal_coordinates(exif.get('GPS GPSLatitude'), exif.get('GPS GPSLatitudeRef'),
+                               exif.get('GPS GPSLongitude'), exif.get('GPS GPSLongitudeRef'))
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points"""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GpsIndex:
+    """Decimal coordinates of geotagged images in a local grid index.
+
+    Sync streams only rows that have 'GPS GPSLatitude' in their EXIF, on its
+    own connection, and parses the degree/minute/second strings once.
+    Points are sorted by grid cell, so a query looks up each grid row of the
+    box with one binary search and checks only the points in those cells.
+    """
+
+    def __init__(self, connect, index_file=INDEX_FILE, cell_size=0.25, fetch_size=5000):
+        self.connect = connect
+        self.index_file = index_file
+        self.cell_size = cell_size
+        self.fetch_size = fetch_size
+        self.grid_rows = int(math.ceil(180 / cell_size))
+        self.grid_columns = int(math.ceil(360 / cell_size))
+
+        self.lock = threading.Lock()
+        self.keys = np.empty(0, dtype=object)
+        self.lat = np.empty(0, dtype=np.float64)
+        self.lon = np.empty(0, dtype=np.float64)
+        self.cells = np.empty(0, dtype=np.int64)
+        self.is_syncing = False
+        self.cancel_event = threading.Event()
+
+        self.load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def load(self):
+        """Load index from file"""
+        if not self.index_file.exists():
+            return
+        try:
+            with np.load(self.index_file, allow_pickle=True) as data:
+                keys, lat, lon = data['keys'], data['lat'], data['lon']
+            self._set_points(keys, lat, lon)
+        except Exception as e:
+            print(f"Error loading GPS index: {e}")
+
+    def save(self):
+        """Save index to file"""
+        try:
+            CONFIG_DIR.mkdir(exist_ok=True, parents=True)
+            with self.lock:
+                keys, lat, lon = self.keys, self.lat, self.lon
+            tmp_file = self.index_file.with_suffix('.tmp.npz')
+            np.savez(tmp_file, keys=keys, lat=lat, lon=lon)
+            tmp_file.replace(self.index_file)
+            return True
+        except Exception as e:
+            print(f"Error saving GPS index: {e}")
+            return False
+
+    def cell_of(self, lat, lon):
+        rows = np.clip(((lat + 90) // self.cell_size).astype(np.int64), 0, self.grid_rows - 1)
+        columns = np.clip(((lon + 180) // self.cell_size).astype(np.int64), 0, self.grid_columns - 1)
+        return rows * self.grid_columns + columns
+
+    def _set_points(self, keys, lat, lon):
+        cells = self.cell_of(lat, lon)
+        order = np.argsort(cells, kind='stable')
+        with self.lock:
+            self.keys = keys[order]
+            self.lat = lat[order]
+            self.lon = lon[order]
+            self.cells = cells[order]
+
+    def sync(self, progress=None):
+        """Re-read the coordinates of every geotagged row.
+
+        `progress(rows)` is called from the worker thread after each batch.
+        The server can answer the `exif ? 'GPS GPSLatitude'` filter from a GIN
+        index on exif. Returns the number of indexed images, or None if cancelled.
+        """
+        if self.is_syncing:
+            return None
+
+        self.is_syncing = True
+        self.cancel_event.clear()
+        conn = None
+        try:
+            conn = self.connect()
+            cur = conn.cursor(name='mediabrowser_gps')
+            cur.itersize = self.fetch_size
+            cur.execute("""
+                SELECT abs_filename,
+                       exif->>'GPS GPSLatitude', exif->>'GPS GPSLatitudeRef',
+                       exif->>'GPS GPSLongitude', exif->>'GPS GPSLongitudeRef'
+                FROM dm.col_images
+                WHERE exif ? 'GPS GPSLatitude'
+            """)
+
+            keys, lats, lons = [], [], []
+            seen = 0
+            while True:
+                if self.cancel_event.is_set():
+                    return None
+                rows = cur.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                for abs_filename, latitude, latitude_ref, longitude, longitude_ref in rows:
+                    coordinates = decimal_coordinates(latitude, latitude_ref, longitude, longitude_ref)
+                    if coordinates:
+                        keys.append(abs_filename)
+                        lats.append(coordinates[0])
+                        lons.append(coordinates[1])
+                seen += len(rows)
+                if progress:
+                    progress(seen)
+            cur.close()
+
+            self._set_points(np.array(keys, dtype=object),
+                             np.array(lats, dtype=np.float64),
+                             np.array(lons, dtype=np.float64))
+            self.save()
+            return len(keys)
+
+        finally:
+            if conn:
+                try:
+                    conn.close()
+                except:
+                    pass
+            self.is_syncing = False
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _candidates(self, cells, south, west, north, east):
+        """Positions of points in the grid cells covering a box with west <= east"""
+        south_cell, north_cell = self.cell_of(np.array([south, north]), np.array([west, east]))
+        first_row, west_column = divmod(int(south_cell), self.grid_columns)
+        last_row, east_column = divmod(int(north_cell), self.grid_columns)
+
+        row_bases = np.arange(first_row, last_row + 1, dtype=np.int64) * self.grid_columns
+        starts = np.searchsorted(cells, row_bases + west_column, side='left')
+        stops = np.searchsorted(cells, row_bases + east_column, side='right')
+
+        lengths = stops - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return offsets + np.arange(total)
+
+    def _box_positions(self, cells, lat, lon, south, west, north, east):
+        # A box whose west edge is east of its east edge crosses the antimeridian
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        found = []
+        for span_west, span_east in spans:
+            candidates = self._candidates(cells, south, span_west, north, span_east)
+            inside = ((lat[candidates] >= south) & (lat[candidates] <= north)
+                      & (lon[candidates] >= span_west) & (lon[candidates] <= span_east))
+            found.append(candidates[inside])
+        return np.concatenate(found)
+
+    def search_box(self, south, west, north, east, limit=2000):
+        """Return (keys, total) of images inside the box, northernmost first"""
+        with self.lock:
+            keys, lat, lon, cells = self.keys, self.lat, self.lon, self.cells
+        positions = self._box_positions(cells, lat, lon, south, west, north, east)
+        positions = positions[np.argsort(-lat[positions], kind='stable')]
+        return keys[positions[:limit]].tolist(), len(positions)
+
+    def search_radius(self, latitude, longitude, radius_km, limit=2000):
+        """Return ([(key, distance_km)], total) of images within the radius, nearest first"""
+        with self.lock:
+            keys, lat, lon, cells = self.keys, self.lat, self.lon, self.cells
+
+        angle = radius_km / EARTH_RADIUS_KM
+        delta_lat = math.degrees(angle)
+        south = max(latitude - delta_lat, -90.0)
+        north = min(latitude + delta_lat, 90.0)
+
+        # Longitude span of the circle; the whole parallel if it reaches a pole
+        cos_lat = math.cos(math.radians(latitude))
+        if north >= 90.0 or south <= -90.0 or math.sin(angle) >= cos_lat:
+            west, east = -180.0, 180.0
+        else:
+            delta_lon = math.degrees(math.asin(math.sin(angle) / cos_lat))
+            west = (longitude - delta_lon + 180.0) % 360.0 - 180.0
+            east = (longitude + delta_lon + 180.0) % 360.0 - 180.0
+
+        positions = self._box_positions(cells, lat, lon, south, west, north, east)
+        distances = haversine_km(latitude, longitude, lat[positions], lon[positions])
+        within = distances <= radius_km
+        positions, distances = positions[within], distances[within]
+
+        total = len(positions)
+        if total > limit:
+            nearest = np.argpartition(distances, limit - 1)[:limit]
+            positions, distances = positions[nearest], distances[nearest]
+        order = np.argsort(distances, kind='stable')
+        return [(keys[i], float(d)) for i, d in zip(positions[order], distances[order])], total
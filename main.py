@@ -1,7 +1,9 @@
+import os
 import tkinter as tk
 from tkinter import messagebox
 import traceback
 from mediabrowser import MediaBrowser
+from replay import InteractionRecorder
 
 def main():
     try:
@@ -13,15 +15,20 @@ def main():
         except:
             pass
 
-        app = MediaBrowser(root)
+        # MEDIABROWSER_RECORD=trace.jsonl records UI events for replay.py
+        record_path = os.environ.get('MEDIABROWSER_RECORD')
+        recorder = InteractionRecorder(record_path) if record_path else None
+
+        app = MediaBrowser(root, recorder=recorder)
 
         def on_closing():
             """Handle application closing"""
             try:
-                if app.conn:
-                    app.conn.close()
+                app.shutdown()
             except:
                 pass
+            if recorder:
+                recorder.close()
             root.destroy()
 
         root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -4,25 +4,43 @@ import os
 import subprocess
 import threading
 import tkinter as tk
-from tkinter import ttk, scrolledtext, Menu, messagebox
+from tkinter import ttk, scrolledtext, Menu, messagebox, simpledialog
 
-import psycopg2
 from PIL import Image, ImageTk
 from psycopg2 import OperationalError
 
-from config import Config
+from caption_index import CaptionIndex
+from config import Config, PRIMARY_SOURCE
 from config_dialog import ConfigDialog
+from export_dialog import ExportDialog
+from facets import FACET_LABELS, FACET_ORDER, FacetCounter
+from fanout import FanOutEngine
+from folder_tree import (FOLDER_PREFIX, MORE_PREFIX, PLACEHOLDER_PREFIX, FolderCache, folder_iid,
+                         is_folder_item, prefix_of)
+from file_index import FileAvailabilityIndex
+from gps_index import GpsIndex, gps_from_exif
+from tile_viewer import TileViewer
+from timeline import TimelineHistogram, jump_cursor, month_label
+from phash_index import PreviewHashIndex
+from preview_cache import PreviewCache
+from query_engine import ORDER_FILENAME, ORDER_TIMELINE, QueryEngine, SearchFilter
+from saved_searches import SavedSearches
 
 
 class MediaBrowser:
-    def __init__(self, root):
+    def __init__(self, root, config=None, recorder=None, autostart=True):
         self.root = root
         self.root.title("Media Browser")
         self.root.geometry("1600x900")
 
-        self.config = Config()
+        self.config = config or Config()
+        # InteractionRecorder from replay.py, set when recording a trace
+        self.recorder = recorder
 
-        self.conn = None
+        self.engine = QueryEngine(self.config.db_config)
+        self.fanout = None
+        self.pager = None
+        self.item_sources = {}
 
         self.current_offset = 0
         self.batch_size = 100
@@ -35,11 +53,45 @@ class MediaBrowser:
 
         self.current_disk_label = self.config.disk_label
 
+        self.hash_index = PreviewHashIndex(self.engine.create_connection)
+        self.gps_index = GpsIndex(self.engine.create_connection)
+        self.caption_index = CaptionIndex(self.engine.create_connection)
+        self.selected_gps = None
+        self.file_index = FileAvailabilityIndex(self.current_disk_label)
+        self.preview_cache = PreviewCache()
+        self.preview_lock = threading.Lock()
+        self.preview_request = None
+        self.preview_worker_busy = False
+        self.saved_searches = SavedSearches()
+        self.result_set_label = None
+
+        self.timeline_mode = False
+        self.timeline_cursor = None
+        self.timeline_histogram = TimelineHistogram()
+
+        self.folder_mode = False
+        self.folder_cache = FolderCache(self.engine)
+        self.folder_generation = 0
+        self.folder_loads = set()
+
+        self.facets = {}
+        self.show_facets = True
+        self.facet_counter = FacetCounter(self.source_engines)
+        self.facet_items = {}
+
         self.setup_ui()
         self.setup_menu()
 
+        if autostart:
+            self.start()
+
+    def start(self):
+        """Connect and load the first page, then rescan the disk index"""
         self.try_connect()
 
+        # Only directories changed since the cached index was written are listed again
+        self.scan_disk()
+
     def setup_ui(self):
         control_frame = ttk.Frame(self.root)
         control_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -99,6 +151,14 @@ class MediaBrowser:
         )
         self.open_in_viewer_button.pack(side=tk.LEFT, padx=5)
 
+        self.zoom_original_button = ttk.Button(
+            open_frame,
+            text="Zoom original",
+            command=self.open_tile_viewer,
+            state="disabled"
+        )
+        self.zoom_original_button.pack(side=tk.LEFT, padx=5)
+
         main_frame = ttk.Frame(self.root)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
@@ -122,7 +182,7 @@ class MediaBrowser:
         self.tree.heading('Filename', text='Filename')
         self.tree.column('Filename', width=300, minwidth=200, stretch=True)  # Увеличена ширина
 
-        self.v_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.v_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.on_scrollbar)
         self.h_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
         self.tree.configure(yscrollcommand=self.on_tree_scroll, xscrollcommand=self.h_scrollbar.set)
 
@@ -133,6 +193,29 @@ class MediaBrowser:
         tree_frame.grid_rowconfigure(0, weight=1)
         tree_frame.grid_columnconfigure(0, weight=1)
 
+        # Timeline panel, shown only in timeline mode
+        self.timeline_container = ttk.LabelFrame(left_panel, text="Timeline")
+
+        jump_frame = ttk.Frame(self.timeline_container)
+        jump_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(jump_frame, text="Jump to (YYYY-MM-DD):").pack(side=tk.LEFT)
+        self.jump_var = tk.StringVar()
+        jump_entry = ttk.Entry(jump_frame, textvariable=self.jump_var, width=12)
+        jump_entry.pack(side=tk.LEFT, padx=5)
+        jump_entry.bind('<Return>', lambda e: self.jump_to_date(self.jump_var.get()))
+        ttk.Button(jump_frame, text="Go", command=lambda: self.jump_to_date(self.jump_var.get())).pack(side=tk.LEFT)
+
+        self.timeline_tree = ttk.Treeview(self.timeline_container, columns=('Month', 'Count', 'Bar'),
+                                          show='headings', height=8)
+        self.timeline_tree.heading('Month', text='Month')
+        self.timeline_tree.heading('Count', text='Images')
+        self.timeline_tree.heading('Bar', text='')
+        self.timeline_tree.column('Month', width=100, stretch=False)
+        self.timeline_tree.column('Count', width=70, stretch=False, anchor=tk.E)
+        self.timeline_tree.column('Bar', width=200, stretch=True)
+        self.timeline_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.timeline_tree.bind('<<TreeviewSelect>>', self.on_timeline_select)
+
         # ===== ЦЕНТРАЛЬНАЯ ПАНЕЛЬ (превью) - СДЕЛАНО УЖЕ =====
         center_panel = ttk.Frame(self.main_paned)
         self.main_paned.add(center_panel, weight=1)  # Уменьшенный вес для меньшей ширины
@@ -149,6 +232,7 @@ class MediaBrowser:
         self.preview_canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
         self.preview_canvas.bind('<Configure>', self.on_preview_resize)
+        self.preview_canvas.bind('<Double-Button-1>', lambda e: self.open_tile_viewer())
         self.current_image_data = None
         self.current_pil_image = None
 
@@ -163,6 +247,23 @@ class MediaBrowser:
         right_panel = ttk.Frame(self.main_paned)
         self.main_paned.add(right_panel, weight=2)  # Увеличенный вес для большей ширины
 
+        # Facet sidebar: counts per camera, lens, year and folder for the current search
+        self.facet_container = ttk.LabelFrame(right_panel, text="Facets")
+        self.facet_container.pack(fill=tk.BOTH, padx=5, pady=5)
+
+        self.facet_tree = ttk.Treeview(self.facet_container, columns=('Count',), show='tree headings', height=10)
+        self.facet_tree.heading('#0', text='Value', anchor=tk.W)
+        self.facet_tree.heading('Count', text='Images')
+        self.facet_tree.column('#0', width=300, stretch=True)
+        self.facet_tree.column('Count', width=70, stretch=False, anchor=tk.E)
+
+        facet_scrollbar = ttk.Scrollbar(self.facet_container, orient=tk.VERTICAL, command=self.facet_tree.yview)
+        self.facet_tree.configure(yscrollcommand=facet_scrollbar.set)
+
+        self.facet_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        facet_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.facet_tree.bind('<<TreeviewSelect>>', self.on_facet_select)
+
         exif_container = ttk.LabelFrame(right_panel, text="EXIF Information")
         exif_container.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
@@ -183,88 +284,257 @@ class MediaBrowser:
         self.main_paned.sashpos(1, 800)
         center_vertical.sashpos(0, 400)
 
+        self.tree.tag_configure('offline', foreground='gray')
+
         self.tree.bind('<<TreeviewSelect>>', self.on_select)
+        self.tree.bind('<<TreeviewOpen>>', self.on_tree_open)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(sequence, self.on_tree_wheel)
 
     def on_filter_changed(self):
         self.hide_no_preview = self.hide_no_preview_var.get()
         self.reload_data()
 
+    def current_filter(self):
+        """Return the SearchFilter for the current search and filter settings"""
+        return SearchFilter(self.current_search, self.hide_no_preview, self.facets)
+
     def load_images(self, initial_load=False):
-        if self.is_loading or not self.conn:
+        if self.is_loading or not self.engine.is_connected:
+            return
+        if self.folder_mode:
+            # Folders load on expansion, there is no flat list to page through
+            if initial_load:
+                self.show_folder_root()
             return
 
         self.is_loading = True
         self.status_var.set("Loading...")
 
+        search_filter = self.current_filter()
+        order = ORDER_TIMELINE if self.timeline_mode else ORDER_FILENAME
+        offset = 0 if initial_load else self.current_offset
+        cursor = self.timeline_cursor
+
+        if self.fanout and (initial_load or self.pager is None):
+            self.pager = self.fanout.pager(search_filter, order, cursor)
+        pager = self.pager if self.fanout else None
+
         def load_in_thread():
             try:
-                cur = self.conn.cursor()
-                offset = 0 if initial_load else self.current_offset
+                if pager:
+                    rows, sources = self.merge_sources_page(pager)
+                    has_more = pager.has_more
+                    self.root.after(0, self.item_sources.update, sources)
+                else:
+                    rows, next_cursor = self.engine.fetch_page(
+                        search_filter, limit=self.batch_size, offset=offset, order=order, cursor=cursor)
 
-                where_clauses = []
-                params = []
+                    if next_cursor:
+                        # Seek from the last row on the next page instead of OFFSET
+                        self.timeline_cursor = next_cursor
 
-                if self.current_search:
-                    where_clauses.append(
-                        "(latest_caption ILIKE %s OR exif::text ILIKE %s OR rel_filename ILIKE %s)"
-                    )
-                    search_param = f'%{self.current_search}%'
-                    params.extend([search_param, search_param, search_param])
+                    has_more = len(rows) == self.batch_size
 
-                if self.hide_no_preview:
-                    where_clauses.append("preview IS NOT NULL")
+                self.root.after(0, self.update_treeview, rows, has_more, initial_load)
 
-                where_clause = ""
-                if where_clauses:
-                    where_clause = "WHERE " + " AND ".join(where_clauses)
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
+                self.root.after(0, lambda: setattr(self, 'is_loading', False))
 
-                query = f"""
-                SELECT abs_filename, rel_filename, preview, latest_caption, exif 
-                FROM dm.col_images
-                {where_clause}
-                ORDER BY rel_filename desc
-                LIMIT %s OFFSET %s
-                """
+        threading.Thread(target=load_in_thread, daemon=True).start()
 
-                params.extend([self.batch_size, offset])
-                cur.execute(query, params)
+    def merge_sources_page(self, pager):
+        """Next merged page across sources, with tree ids that are unique per source"""
+        rows = []
+        sources = {}
+        for name, row in pager.next_page(self.batch_size):
+            abs_filename = row[0]
+            item_id = abs_filename if name == PRIMARY_SOURCE else f"{name}|{abs_filename}"
+            sources[item_id] = (name, abs_filename)
+            rows.append((item_id,) + tuple(row[1:]))
+        return rows, sources
+
+    def engine_for_item(self, item_id):
+        """Return (engine, abs_filename) for a tree item"""
+        name, abs_filename = self.item_sources.get(item_id, (PRIMARY_SOURCE, item_id))
+        if self.fanout and name in self.fanout.engines:
+            return self.fanout.engines[name], abs_filename
+        return self.engine, abs_filename
+
+    def source_engines(self):
+        """Connected engines by source name; just the primary one without additional sources"""
+        if self.fanout:
+            return {name: self.fanout.engines[name] for name in self.fanout.connected_names}
+        return {PRIMARY_SOURCE: self.engine}
+
+    def setup_fanout(self):
+        """Connect the additional sources, if any, alongside the primary engine"""
+        if self.fanout:
+            self.fanout.close(keep=self.engine)
+            self.fanout = None
+        self.pager = None
+
+        if not self.config.sources:
+            return
 
-                rows = cur.fetchall()
-                cur.close()
+        self.fanout = FanOutEngine(self.config.all_sources(), engines={PRIMARY_SOURCE: self.engine})
+        connected = self.fanout.connect()
+        total = len(self.fanout.names)
+        message = f"Connected to {len(connected)}/{total} sources"
+        if self.fanout.errors:
+            message += " (unavailable: " + ", ".join(sorted(self.fanout.errors)) + ")"
+        self.status_var.set(message)
+
+    def update_searches_menu(self):
+        self.searches_menu.delete(0, tk.END)
+        self.searches_menu.add_command(label="Save Current Search...", command=self.save_current_search)
+        self.searches_menu.add_command(label="Delete Saved Search...", command=self.delete_saved_search)
+        names = self.saved_searches.names()
+        if names:
+            self.searches_menu.add_separator()
+        for name in names:
+            self.searches_menu.add_command(label=name, command=lambda n=name: self.open_saved_search(n))
+
+    def save_current_search(self):
+        default = self.current_search or "All images"
+        name = simpledialog.askstring("Save Search", "Name:", initialvalue=default, parent=self.root)
+        if not name or not name.strip():
+            return
+        self.saved_searches.add(name.strip(), self.current_filter())
+        self.update_searches_menu()
+        self.status_var.set(f"Saved search '{name.strip()}'")
+
+    def delete_saved_search(self):
+        names = self.saved_searches.names()
+        if not names:
+            self.status_var.set("No saved searches")
+            return
+        name = simpledialog.askstring("Delete Saved Search", "Name:\n" + "\n".join(names), parent=self.root)
+        if name and self.saved_searches.get(name.strip()):
+            self.saved_searches.remove(name.strip())
+            self.update_searches_menu()
+            self.status_var.set(f"Deleted saved search '{name.strip()}'")
+
+    def open_saved_search(self, name):
+        """Show the cached first page at once, then revalidate it in the background"""
+        search = self.saved_searches.get(name)
+        if not search:
+            return
 
-                has_more = len(rows) == self.batch_size
+        # Snapshots cover the primary source in filename order only
+        use_snapshot = not (self.fanout or self.timeline_mode or self.folder_mode or not self.engine.is_connected)
+        if use_snapshot and self.is_loading:
+            # Checked before touching the filter, which must keep matching the list being loaded
+            return
 
-                self.root.after(0, self.update_treeview, rows, has_more, initial_load)
+        search_filter = self.saved_searches.filter_for(search)
+        self.search_var.set(search_filter.search)
+        self.hide_no_preview = search_filter.hide_no_preview
+        self.hide_no_preview_var.set(search_filter.hide_no_preview)
+        self.facets = dict(search_filter.facets)
 
+        if not use_snapshot:
+            self.start_search()
+            return
+
+        self.current_search = search_filter.search
+        self.result_set_label = None
+        self.refresh_facets()
+        self.timeline_cursor = None
+        self.current_offset = 0
+        self.has_more_data = True
+        self.tree.delete(*self.tree.get_children())
+
+        snapshot = self.saved_searches.load_snapshot(search_filter)
+        if snapshot:
+            self.update_treeview(self.rows_from_digests(snapshot['rows']), True, True)
+            self.update_loaded_status(True, "(cached, revalidating...)")
+
+        self.is_loading = True
+
+        def revalidate_in_thread():
+            try:
+                rows, changed_keys = self.saved_searches.revalidate(
+                    self.engine, search_filter, self.batch_size, self.preview_cache, snapshot)
+                full_rows = self.rows_from_digests(rows)
+                has_more = len(rows) == self.batch_size
+                self.root.after(0, self.apply_revalidated_page, search_filter, full_rows, changed_keys, has_more)
             except Exception as e:
                 self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
                 self.root.after(0, lambda: setattr(self, 'is_loading', False))
 
-        threading.Thread(target=load_in_thread, daemon=True).start()
+        threading.Thread(target=revalidate_in_thread, daemon=True).start()
+
+    def rows_from_digests(self, digest_rows):
+        """Turn (abs, rel, preview_md5, caption, exif) rows into list rows using the preview cache"""
+        rows = []
+        for abs_filename, rel_filename, digest, caption, exif in digest_rows:
+            preview = self.preview_cache.get(digest) if digest else None
+            rows.append((abs_filename, rel_filename, preview, caption, exif))
+        return rows
+
+    def apply_revalidated_page(self, search_filter, rows, changed_keys, has_more_data):
+        """Bring the list in line with the fresh first page, touching only changed rows"""
+        if search_filter.key() != self.current_filter().key() or self.result_set_label:
+            # The user moved on to another search meanwhile; its load waited for us
+            self.is_loading = False
+            self.load_images(initial_load=True)
+            return
+
+        fresh_keys = {row[0] for row in rows}
+        for item_id in self.tree.get_children():
+            if item_id not in fresh_keys or item_id in changed_keys:
+                self.tree.delete(item_id)
+                self.thumbnail_photos.pop(item_id, None)
+
+        for index, row in enumerate(rows):
+            if self.tree.exists(row[0]):
+                self.tree.move(row[0], '', index)
+            else:
+                self.insert_row(row, index)
+
+        self.has_more_data = has_more_data
+        self.is_loading = False
+        self.update_loaded_status(has_more_data, f"({len(changed_keys)} changed since last visit)")
 
     def start_search(self):
         search_term = self.search_var.get().strip()
+        if self.recorder:
+            self.recorder.record('start_search', search=search_term)
         self.current_search = search_term
+        self.result_set_label = None
+        self.timeline_cursor = None
         self.current_offset = 0
         self.has_more_data = True
         self.thumbnail_cache.clear()
         self.thumbnail_photos.clear()
         self.tree.delete(*self.tree.get_children())
         self.load_images(initial_load=True)
+        if self.timeline_mode:
+            self.refresh_timeline()
+        self.refresh_facets()
 
     def clear_search(self):
         self.search_var.set("")
         self.current_search = ""
+        self.facets = {}
+        self.result_set_label = None
+        self.timeline_cursor = None
         self.current_offset = 0
         self.has_more_data = True
         self.thumbnail_cache.clear()
         self.thumbnail_photos.clear()
         self.tree.delete(*self.tree.get_children())
         self.load_images(initial_load=True)
+        if self.timeline_mode:
+            self.refresh_timeline()
+        self.refresh_facets()
 
     def try_connect(self):
         if self.connect_db():
             self.load_images(initial_load=True)
+            self.refresh_facets()
         else:
             response = messagebox.askyesno(
                 "Connection Failed",
@@ -277,28 +547,15 @@ class MediaBrowser:
 
     def connect_db(self):
         try:
-            if self.conn:
-                try:
-                    self.conn.close()
-                except:
-                    pass
-
             self.status_var.set("Connecting to database...")
 
-            self.conn = psycopg2.connect(
-                host=self.config.db_config["host"],
-                port=self.config.db_config.get("port", "5432"),
-                database=self.config.db_config["database"],
-                user=self.config.db_config["user"],
-                password=self.config.db_config["password"],
-                connect_timeout=10
-            )
-
-            cur = self.conn.cursor()
-            cur.execute("SELECT 1")
-            cur.close()
+            self.engine.db_config = dict(self.config.db_config)
+            self.engine.connect()
+            self.facet_counter.close()
+            self.facet_counter.clear()
 
             self.status_var.set("Connected to database")
+            self.setup_fanout()
             return True
 
         except OperationalError as e:
@@ -311,12 +568,12 @@ class MediaBrowser:
                 self.status_var.set("Database does not exist")
             else:
                 self.status_var.set(f"Database error: {error_msg[:50]}...")
-            self.conn = None
+            self.engine.close()
             return False
 
         except Exception as e:
             self.status_var.set(f"Connection error: {str(e)[:50]}...")
-            self.conn = None
+            self.engine.close()
             return False
 
     def setup_menu(self):
@@ -326,6 +583,7 @@ class MediaBrowser:
         file_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Configuration", command=self.show_config_dialog)
+        file_menu.add_command(label="Export Results...", command=self.show_export_dialog)
         file_menu.add_separator()
         file_menu.add_command(label="Reconnect", command=self.reconnect_db)
         file_menu.add_separator()
@@ -335,6 +593,39 @@ class MediaBrowser:
         menubar.add_cascade(label="View", menu=view_menu)
         view_menu.add_command(label="Reload", command=self.reload_data)
         view_menu.add_command(label="Clear Cache", command=self.clear_cache)
+        view_menu.add_command(label="Preview Cache Statistics",
+                              command=lambda: self.status_var.set(self.preview_cache.summary()))
+        view_menu.add_command(label="Clear Preview Cache", command=self.clear_preview_cache)
+        view_menu.add_separator()
+        self.timeline_mode_var = tk.BooleanVar(value=self.timeline_mode)
+        view_menu.add_checkbutton(label="Timeline Mode", variable=self.timeline_mode_var,
+                                  command=self.toggle_timeline_mode)
+        self.folder_mode_var = tk.BooleanVar(value=self.folder_mode)
+        view_menu.add_checkbutton(label="Folder Tree Mode", variable=self.folder_mode_var,
+                                  command=self.toggle_folder_mode)
+        self.show_facets_var = tk.BooleanVar(value=self.show_facets)
+        view_menu.add_checkbutton(label="Facet Sidebar", variable=self.show_facets_var,
+                                  command=self.toggle_facets)
+        view_menu.add_separator()
+        view_menu.add_command(label="Rescan Disk", command=self.scan_disk)
+
+        tools_menu = Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        tools_menu.add_command(label="Build Similarity Index", command=self.build_hash_index)
+        tools_menu.add_command(label="Rebuild Similarity Index", command=lambda: self.build_hash_index(rebuild=True))
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Find Similar to Selected", command=self.find_similar_to_selected)
+        tools_menu.add_command(label="List Duplicate Clusters", command=self.show_duplicate_clusters)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Sync Caption Index", command=self.sync_caption_index)
+        tools_menu.add_command(label="Find Similar Captions to Selected", command=self.find_similar_captions)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Sync GPS Index", command=self.sync_gps_index)
+        tools_menu.add_command(label="Search by Location...", command=self.show_location_search)
+
+        self.searches_menu = Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Searches", menu=self.searches_menu)
+        self.update_searches_menu()
 
     def reconnect_db(self):
         if self.connect_db():
@@ -343,7 +634,11 @@ class MediaBrowser:
     def show_config_dialog(self, first_time=False):
         dialog = ConfigDialog(self.root, self.config)
         if dialog.show():
-            self.current_disk_label = self.config.disk_label
+            if self.current_disk_label != self.config.disk_label:
+                self.current_disk_label = self.config.disk_label
+                self.file_index.cancel()
+                self.file_index = FileAvailabilityIndex(self.current_disk_label)
+                self.scan_disk()
             self.update_disk_label_display()
 
             if self.connect_db():
@@ -359,6 +654,23 @@ class MediaBrowser:
                         "Configuration saved but connection failed. Check your settings."
                     )
 
+    def show_export_dialog(self):
+        if not self.engine.is_connected:
+            self.status_var.set("Not connected to database")
+            return
+
+        search_filter = self.current_filter()
+        where_clause, params = search_filter.where_clause()
+        description = f"search '{self.current_search}'" if self.current_search else "all images"
+        facets = [f"{FACET_LABELS[name].lower()} {self.facet_value_label(search_filter.facets[name])}"
+                  for name in FACET_ORDER if name in search_filter.facets]
+        if facets:
+            description += f" with {', '.join(facets)}"
+        if self.hide_no_preview:
+            description += " (no previews hidden)"
+
+        ExportDialog(self.root, self.engine.create_connection, where_clause, params, description).show()
+
     def update_disk_label_display(self):
         self.disk_label_display.config(text=self.current_disk_label)
 
@@ -379,7 +691,7 @@ class MediaBrowser:
         if hasattr(self, 'selected_rel_filename') and self.selected_rel_filename:
             win_path = os.path.join(self.current_disk_label, self.selected_rel_filename).replace('/', '\\')
 
-            if os.path.exists(win_path):
+            def open_viewer():
                 try:
                     if os.name == 'nt':
                         os.startfile(win_path)
@@ -391,36 +703,710 @@ class MediaBrowser:
                     self.status_var.set(f"Opened in default viewer: {win_path}")
                 except Exception as e:
                     self.status_var.set(f"Error opening in viewer: {str(e)}")
-            else:
-                self.status_var.set(f"Path not found: {win_path}")
+
+            self.when_file_available(self.selected_rel_filename, win_path, open_viewer)
+        else:
+            self.status_var.set("No file available")
+
+    def open_tile_viewer(self):
+        """Open the original in the zoom/pan viewer"""
+        if hasattr(self, 'selected_rel_filename') and self.selected_rel_filename:
+            win_path = os.path.join(self.current_disk_label, self.selected_rel_filename).replace('/', '\\')
+            if os.name != 'nt':
+                win_path = win_path.replace('\\', '/')
+
+            short_name = self.selected_rel_filename.split('/')[-1]
+            self.when_file_available(self.selected_rel_filename, win_path,
+                                     lambda: TileViewer(self.root, win_path, title=short_name).show())
         else:
             self.status_var.set("No file available")
 
     def open_explorer(self):
         win_path = os.path.join(self.current_disk_label, self.selected_rel_filename).replace('/', '\\')
-        if os.path.exists(win_path):
+
+        def select_in_explorer():
             try:
                 subprocess.Popen(f'explorer /select,"{win_path}"')
                 self.status_var.set(f"Opened explorer: {win_path}")
             except Exception as e:
                 self.status_var.set(f"Error opening explorer: {str(e)}")
-        else:
-            self.status_var.set(f"Path not found: {win_path}")
+
+        self.when_file_available(self.selected_rel_filename, win_path, select_in_explorer)
+
+    def when_file_available(self, rel_filename, path, action):
+        """Run `action` on the Tk thread if the file exists.
+
+        The disk index answers directly; only while a scan is running is a
+        miss checked on disk, in a worker thread, since network drives can
+        take seconds to answer.
+        """
+        available = self.file_index.contains(rel_filename)
+        if available:
+            action()
+            return
+        if available is False:
+            self.status_var.set(f"File offline: {path}")
+            return
+
+        file_index = self.file_index
+
+        def check_in_thread():
+            if os.path.exists(path):
+                file_index.add(rel_filename)
+                self.root.after(0, self.refresh_availability_tags)
+                self.root.after(0, action)
+            else:
+                self.root.after(0, lambda: self.status_var.set(f"Path not found: {path}"))
+
+        threading.Thread(target=check_in_thread, daemon=True).start()
+
+    def scan_disk(self):
+        file_index = self.file_index
+        if file_index.is_scanning:
+            self.status_var.set("Disk scan already running")
+            return
+
+        def progress(files, directories):
+            self.root.after(0, lambda: self.status_var.set(
+                f"Scanning disk: {files} files in {directories} folders"))
+
+        def scan_in_thread():
+            try:
+                count = file_index.scan(progress)
+                if file_index is not self.file_index:
+                    return
+                if count is None:
+                    message = f"Disk {file_index.disk_label} not available - files shown as offline"
+                else:
+                    message = f"Disk scan complete: {count} files"
+                self.root.after(0, self.refresh_availability_tags)
+                self.root.after(0, lambda: self.status_var.set(message))
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"Disk scan error: {str(e)}"))
+
+        threading.Thread(target=scan_in_thread, daemon=True).start()
+
+    def availability_tags(self, rel_filename):
+        if self.file_index.contains(rel_filename) is False:
+            return ('offline',)
+        return ()
+
+    def refresh_availability_tags(self, parent=''):
+        for item_id in self.tree.get_children(parent):
+            if is_folder_item(item_id):
+                self.refresh_availability_tags(item_id)
+                continue
+            values = self.tree.item(item_id, 'values')
+            if values:
+                self.tree.item(item_id, tags=self.availability_tags(values[0]))
 
     def reload_data(self):
+        self.result_set_label = None
+        self.timeline_cursor = None
         self.current_offset = 0
         self.has_more_data = True
         self.thumbnail_cache.clear()
         self.thumbnail_photos.clear()
+        self.folder_cache.clear()
         self.tree.delete(*self.tree.get_children())
         self.load_images(initial_load=True)
         self.status_var.set("Data reloaded")
+        if self.timeline_mode:
+            self.refresh_timeline(refresh=True)
+        self.refresh_facets(refresh=True)
 
     def clear_cache(self):
         self.thumbnail_cache.clear()
         self.thumbnail_photos.clear()
         self.status_var.set("Cache cleared")
 
+    def clear_preview_cache(self):
+        self.preview_cache.clear()
+        self.status_var.set("Preview cache cleared")
+
+    def shutdown(self):
+        """Release connections and persist caches before the window closes"""
+        self.preview_cache.save_stats()
+        self.gps_index.cancel()
+        self.caption_index.cancel()
+        self.facet_counter.cancel()
+        self.facet_counter.close()
+        if self.fanout:
+            self.fanout.close()
+        self.engine.close()
+
+    def show_result_set(self, abs_filenames, label):
+        """Replace the list with the given rows, in the given order, without paging"""
+        if self.is_loading or not self.engine.is_connected:
+            return
+
+        self.result_set_label = label
+        self.has_more_data = False
+        self.is_loading = True
+        self.tree.delete(*self.tree.get_children())
+        self.status_var.set("Loading...")
+
+        def load_in_thread():
+            try:
+                rows = self.engine.fetch_rows(abs_filenames)
+
+                self.root.after(0, self.update_treeview, rows, False, True)
+
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
+                self.root.after(0, lambda: setattr(self, 'is_loading', False))
+
+        threading.Thread(target=load_in_thread, daemon=True).start()
+
+    def build_hash_index(self, rebuild=False):
+        if self.hash_index.is_building:
+            self.status_var.set("Similarity index is already being built")
+            return
+        if not self.engine.is_connected:
+            self.status_var.set("Not connected to database")
+            return
+
+        if rebuild:
+            self.hash_index.clear()
+
+        def progress(done, total):
+            self.root.after(0, lambda: self.status_var.set(f"Indexing previews: {done}/{total}"))
+
+        def build_in_thread():
+            try:
+                added = self.hash_index.build(progress)
+                total = len(self.hash_index)
+                self.root.after(0, lambda: self.status_var.set(
+                    f"Similarity index ready: {total} images ({added} new)"))
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"Indexing error: {str(e)}"))
+
+        threading.Thread(target=build_in_thread, daemon=True).start()
+
+    def find_similar_to_selected(self):
+        abs_filename = getattr(self, 'selected_abs_filename', None)
+        if not abs_filename:
+            self.status_var.set("No file selected")
+            return
+        if not len(self.hash_index):
+            self.status_var.set("Similarity index is empty - use Tools → Build Similarity Index")
+            return
+
+        similar = self.hash_index.find_similar(abs_filename)
+        if not similar:
+            self.status_var.set("Selected image is not in the similarity index")
+            return
+
+        short_name = abs_filename.split('/')[-1]
+        self.show_result_set([key for key, _ in similar], f"similar to '{short_name}'")
+
+    def show_duplicate_clusters(self):
+        if not len(self.hash_index):
+            self.status_var.set("Similarity index is empty - use Tools → Build Similarity Index")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Duplicate Clusters")
+        dialog.geometry("700x500")
+        dialog.transient(self.root)
+
+        options_frame = ttk.Frame(dialog)
+        options_frame.pack(fill=tk.X, padx=10, pady=5)
+
+        ttk.Label(options_frame, text="Max distance (bits):").pack(side=tk.LEFT)
+        distance_var = tk.IntVar(value=0)
+        # Each extra bit multiplies the number of index tables; past 4 a large index takes minutes
+        ttk.Spinbox(options_frame, from_=0, to=4, textvariable=distance_var, width=5,
+                    state='readonly').pack(side=tk.LEFT, padx=5)
+        ttk.Label(options_frame, foreground='gray',
+                  text="Up to 4 bits; 3-4 bits can take a few seconds on millions of images").pack(side=tk.LEFT, padx=5)
+
+        clusters_tree = ttk.Treeview(dialog, columns=('Size', 'Example'), show='headings')
+        clusters_tree.heading('Size', text='Images')
+        clusters_tree.heading('Example', text='Example')
+        clusters_tree.column('Size', width=80, stretch=False)
+        clusters_tree.column('Example', width=550)
+        clusters_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        clusters = []
+        search = {'cancel': threading.Event()}
+
+        def show_clusters(cancel_event, found):
+            if cancel_event.is_set() or not dialog.winfo_exists():
+                return
+            clusters[:] = found[:1000]
+            for i, cluster in enumerate(clusters):
+                clusters_tree.insert('', tk.END, iid=str(i), values=(len(cluster), cluster[0]))
+            find_button.config(state="normal")
+            self.status_var.set(f"Found {len(found)} duplicate clusters")
+
+        def refresh():
+            search['cancel'].set()
+            cancel_event = search['cancel'] = threading.Event()
+            max_distance = distance_var.get()
+            clusters_tree.delete(*clusters_tree.get_children())
+            clusters.clear()
+            find_button.config(state="disabled")
+            self.status_var.set("Finding duplicate clusters...")
+
+            def progress(done, total):
+                self.root.after(0, lambda: self.status_var.set(
+                    f"Finding duplicate clusters: table {done}/{total}"))
+
+            def find_in_thread():
+                try:
+                    found = self.hash_index.duplicate_clusters(max_distance=max_distance, progress=progress,
+                                                               cancel_event=cancel_event)
+                    if found is not None:
+                        self.root.after(0, show_clusters, cancel_event, found)
+                except Exception as e:
+                    self.root.after(0, lambda: self.status_var.set(f"Clustering error: {str(e)}"))
+
+            threading.Thread(target=find_in_thread, daemon=True).start()
+
+        def on_cluster_select(event):
+            selection = clusters_tree.selection()
+            if selection:
+                self.show_result_set(clusters[int(selection[0])], f"in duplicate cluster #{int(selection[0]) + 1}")
+
+        def on_close():
+            search['cancel'].set()
+            dialog.destroy()
+
+        find_button = ttk.Button(options_frame, text="Find", command=refresh)
+        find_button.pack(side=tk.LEFT, padx=5)
+        clusters_tree.bind('<<TreeviewSelect>>', on_cluster_select)
+        dialog.protocol("WM_DELETE_WINDOW", on_close)
+
+        refresh()
+
+    def sync_caption_index(self):
+        if self.caption_index.is_syncing:
+            self.status_var.set("Caption index is already being synced")
+            return
+        if not self.engine.is_connected:
+            self.status_var.set("Not connected to database")
+            return
+
+        def progress(done, total):
+            self.root.after(0, lambda: self.status_var.set(f"Indexing captions: {done}/{total}"))
+
+        def sync_in_thread():
+            try:
+                result = self.caption_index.sync(progress)
+                if result is not None:
+                    changed, removed = result
+                    total = len(self.caption_index)
+                    self.root.after(0, lambda: self.status_var.set(
+                        f"Caption index ready: {total} captions ({changed} new or changed, {removed} removed)"))
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"Caption index error: {str(e)}"))
+
+        threading.Thread(target=sync_in_thread, daemon=True).start()
+
+    def find_similar_captions(self):
+        abs_filename = getattr(self, 'selected_abs_filename', None)
+        caption = None
+        if self.current_image_data and self.current_image_data[1] == abs_filename:
+            caption = self.current_image_data[0]
+        if not abs_filename or not caption:
+            self.status_var.set("Select an image with a caption first")
+            return
+        if not len(self.caption_index):
+            self.status_var.set("Caption index is empty - use Tools → Sync Caption Index")
+            return
+
+        similar = self.caption_index.similar_to_text(caption, exclude=abs_filename)
+        if not similar:
+            self.status_var.set("No similar captions found")
+            return
+
+        short_name = abs_filename.split('/')[-1]
+        self.show_result_set([key for key, _ in similar], f"with captions like '{short_name}'")
+
+    def sync_gps_index(self):
+        if self.gps_index.is_syncing:
+            self.status_var.set("GPS index is already being synced")
+            return
+        if not self.engine.is_connected:
+            self.status_var.set("Not connected to database")
+            return
+
+        def progress(rows):
+            self.root.after(0, lambda: self.status_var.set(f"Reading GPS tags: {rows} geotagged rows"))
+
+        def sync_in_thread():
+            try:
+                total = self.gps_index.sync(progress)
+                if total is not None:
+                    self.root.after(0, lambda: self.status_var.set(f"GPS index ready: {total} images"))
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"GPS index error: {str(e)}"))
+
+        threading.Thread(target=sync_in_thread, daemon=True).start()
+
+    def show_location_search(self):
+        if not len(self.gps_index):
+            self.status_var.set("GPS index is empty - use Tools → Sync GPS Index")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Search by Location")
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+
+        radius_frame = ttk.LabelFrame(dialog, text="Radius")
+        radius_frame.pack(fill=tk.X, padx=10, pady=5)
+
+        center_lat_var = tk.StringVar()
+        center_lon_var = tk.StringVar()
+        radius_var = tk.StringVar(value="5")
+        if self.selected_gps:
+            center_lat_var.set(f"{self.selected_gps[0]:.6f}")
+            center_lon_var.set(f"{self.selected_gps[1]:.6f}")
+
+        for column, (label, var) in enumerate((("Latitude:", center_lat_var), ("Longitude:", center_lon_var),
+                                                ("Radius (km):", radius_var))):
+            ttk.Label(radius_frame, text=label).grid(row=0, column=column * 2, sticky=tk.W, padx=5, pady=5)
+            ttk.Entry(radius_frame, textvariable=var, width=12).grid(row=0, column=column * 2 + 1, padx=5, pady=5)
+
+        box_frame = ttk.LabelFrame(dialog, text="Bounding box")
+        box_frame.pack(fill=tk.X, padx=10, pady=5)
+
+        box_vars = [tk.StringVar() for _ in range(4)]
+        for column, (label, var) in enumerate(zip(("South:", "West:", "North:", "East:"), box_vars)):
+            ttk.Label(box_frame, text=label).grid(row=0, column=column * 2, sticky=tk.W, padx=5, pady=5)
+            ttk.Entry(box_frame, textvariable=var, width=10).grid(row=0, column=column * 2 + 1, padx=5, pady=5)
+
+        def search_radius():
+            try:
+                latitude = float(center_lat_var.get())
+                longitude = float(center_lon_var.get())
+                radius = float(radius_var.get())
+            except ValueError:
+                messagebox.showwarning("Invalid Input", "Latitude, longitude and radius must be numbers", parent=dialog)
+                return
+            results, total = self.gps_index.search_radius(latitude, longitude, radius)
+            self.show_location_results([key for key, _ in results], total,
+                                       f"within {radius:g} km of {latitude:.4f}, {longitude:.4f}")
+
+        def search_box():
+            try:
+                south, west, north, east = (float(var.get()) for var in box_vars)
+            except ValueError:
+                messagebox.showwarning("Invalid Input", "All four box edges must be numbers", parent=dialog)
+                return
+            keys, total = self.gps_index.search_box(south, west, north, east)
+            self.show_location_results(keys, total, f"in box {south:g}, {west:g} – {north:g}, {east:g}")
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Search Radius", command=search_radius).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Search Box", command=search_box).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+
+    def show_location_results(self, keys, total, label):
+        if not keys:
+            self.status_var.set(f"No geotagged images {label}")
+            return
+        if total > len(keys):
+            label = f"{label} (first {len(keys)} of {total})"
+        self.show_result_set(keys, label)
+
+    def toggle_timeline_mode(self):
+        self.timeline_mode = self.timeline_mode_var.get()
+        if self.timeline_mode:
+            self.set_folder_mode(False)
+            self.timeline_container.pack(fill=tk.BOTH, padx=5, pady=5)
+        else:
+            self.timeline_container.pack_forget()
+
+        self.result_set_label = None
+        self.timeline_cursor = None
+        self.current_offset = 0
+        self.has_more_data = True
+        self.tree.delete(*self.tree.get_children())
+        self.load_images(initial_load=True)
+        if self.timeline_mode:
+            self.refresh_timeline()
+
+    def set_folder_mode(self, enabled):
+        self.folder_mode = enabled
+        self.folder_mode_var.set(enabled)
+        # The preview column also holds the folder hierarchy's indentation
+        self.tree.column('#0', width=200 if enabled else 50)
+        self.tree.heading('Filename', text='Folder / Filename' if enabled else 'Filename')
+
+    def toggle_folder_mode(self):
+        enabled = self.folder_mode_var.get()
+        if enabled and self.timeline_mode:
+            self.timeline_mode_var.set(False)
+            self.timeline_mode = False
+            self.timeline_container.pack_forget()
+        self.set_folder_mode(enabled)
+
+        self.result_set_label = None
+        self.timeline_cursor = None
+        self.current_offset = 0
+        self.has_more_data = True
+        self.tree.delete(*self.tree.get_children())
+        self.load_images(initial_load=True)
+
+    def show_folder_root(self):
+        self.folder_generation += 1
+        self.folder_loads.clear()
+        self.has_more_data = False
+        self.tree.delete(*self.tree.get_children())
+        self.load_folder("", "")
+
+    def load_folder(self, prefix, parent):
+        """List one folder in the background and show it under the `parent` item"""
+        if prefix in self.folder_loads:
+            # Reopened or double-clicked before its listing arrived
+            return
+        self.folder_loads.add(prefix)
+        search_filter = self.current_filter()
+        generation = self.folder_generation
+        self.status_var.set(f"Loading {prefix or 'folders'}...")
+
+        def load_in_thread():
+            try:
+                listing = self.folder_cache.listing(search_filter, prefix)
+                self.root.after(0, self.show_folder_listing, generation, prefix, parent, listing)
+            except Exception as e:
+                self.root.after(0, self.folder_load_failed, generation, prefix, str(e))
+
+        threading.Thread(target=load_in_thread, daemon=True).start()
+
+    def folder_load_failed(self, generation, prefix, message):
+        if generation == self.folder_generation:
+            self.folder_loads.discard(prefix)
+        self.status_var.set(f"Error: {message}")
+
+    def show_folder_listing(self, generation, prefix, parent, listing):
+        if generation != self.folder_generation:
+            return
+        self.folder_loads.discard(prefix)
+        if parent and not self.tree.exists(parent):
+            return
+
+        placeholder = PLACEHOLDER_PREFIX + prefix
+        if self.tree.exists(placeholder):
+            self.tree.delete(placeholder)
+
+        for name, count in listing['folders']:
+            child_prefix = f"{prefix}{name}/"
+            if self.tree.exists(folder_iid(child_prefix)):
+                continue
+            item_id = self.tree.insert(parent, tk.END, iid=folder_iid(child_prefix), text='',
+                                       values=(f"{name}/  ({count})",))
+            # Gives the folder an expander; replaced by the listing when opened
+            self.tree.insert(item_id, tk.END, iid=PLACEHOLDER_PREFIX + child_prefix, text='',
+                             values=("Loading...",))
+
+        self.append_folder_files(generation, prefix, parent, listing['files'], listing['has_more'])
+        self.status_var.set(f"{prefix or 'Root'}: {len(listing['folders'])} folders, "
+                            f"{len(listing['files'])} files")
+
+    def append_folder_files(self, generation, prefix, parent, rows, has_more):
+        if generation != self.folder_generation or (parent and not self.tree.exists(parent)):
+            return
+        for row in rows:
+            if not self.tree.exists(row[0]):
+                self.insert_row(row, parent=parent)
+        if has_more and not self.tree.exists(MORE_PREFIX + prefix):
+            self.tree.insert(parent, tk.END, iid=MORE_PREFIX + prefix, text='', values=("Load more files...",))
+
+    def on_tree_open(self, event):
+        item_id = self.tree.focus()
+        if not item_id.startswith(FOLDER_PREFIX):
+            return
+        prefix = prefix_of(item_id)
+        if self.tree.exists(PLACEHOLDER_PREFIX + prefix):
+            self.load_folder(prefix, item_id)
+
+    def load_more_folder_files(self, more_item):
+        prefix = prefix_of(more_item)
+        parent = self.tree.parent(more_item)
+        siblings = self.tree.get_children(parent)
+        self.tree.delete(more_item)
+
+        last_file = siblings[-2] if len(siblings) > 1 and not is_folder_item(siblings[-2]) else None
+        after = self.tree.item(last_file, 'values')[0] if last_file else None
+        search_filter = self.current_filter()
+        generation = self.folder_generation
+
+        def load_in_thread():
+            try:
+                rows, has_more = self.folder_cache.more_files(search_filter, prefix, after)
+                self.root.after(0, self.append_folder_files, generation, prefix, parent, rows, has_more)
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
+
+        threading.Thread(target=load_in_thread, daemon=True).start()
+
+    def refresh_timeline(self, refresh=False):
+        """Fill the month histogram for the current search and filter"""
+        if not self.engine.is_connected:
+            return
+
+        where_clause, params = self.current_filter().where_clause()
+
+        def load_in_thread():
+            try:
+                # The aggregate runs on a dedicated connection so it never queues behind page loads
+                months = self.timeline_histogram.get(where_clause, params, None, refresh=refresh)
+                if months is None:
+                    conn = self.engine.create_connection()
+                    try:
+                        months = self.timeline_histogram.get(where_clause, params, conn, refresh=refresh)
+                    finally:
+                        conn.close()
+                self.root.after(0, self.update_timeline, months)
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"Timeline error: {str(e)}"))
+
+        threading.Thread(target=load_in_thread, daemon=True).start()
+
+    def update_timeline(self, months):
+        self.timeline_tree.delete(*self.timeline_tree.get_children())
+        largest = max((count for _, count in months), default=0)
+        for month, count in months:
+            bar = '█' * max(1, round(30 * count / largest)) if largest else ''
+            self.timeline_tree.insert('', tk.END, iid=month or ' ',
+                                      values=(month_label(month), count, bar))
+
+    def on_timeline_select(self, event):
+        selection = self.timeline_tree.selection()
+        if not selection:
+            return
+        month = selection[0].strip()
+        if month:
+            self.jump_to_date(month)
+        else:
+            # Undated rows, blank or placeholder dates like '    :  :  ', sort after every year
+            self.jump_to_cursor(('0', ''), "Unknown date")
+
+    def jump_to_date(self, date_text):
+        try:
+            cursor = jump_cursor(date_text)
+        except ValueError as e:
+            self.status_var.set(str(e))
+            return
+        self.jump_to_cursor(cursor, date_text.strip())
+
+    def jump_to_cursor(self, cursor, label):
+        """Restart the timeline list at a seek position instead of paging up to it"""
+        if self.is_loading:
+            return
+        if not self.timeline_mode:
+            self.set_folder_mode(False)
+            self.timeline_mode_var.set(True)
+            self.timeline_mode = True
+            self.timeline_container.pack(fill=tk.BOTH, padx=5, pady=5)
+            self.refresh_timeline()
+
+        self.result_set_label = f"from {label}"
+        self.timeline_cursor = cursor
+        self.current_offset = 0
+        self.has_more_data = True
+        self.tree.delete(*self.tree.get_children())
+        self.load_images(initial_load=True)
+
+    def toggle_facets(self):
+        self.show_facets = self.show_facets_var.get()
+        if self.show_facets:
+            self.facet_container.pack(fill=tk.BOTH, padx=5, pady=5, before=self.exif_tree.master)
+            self.refresh_facets()
+        else:
+            self.facet_counter.cancel()
+            self.facet_container.pack_forget()
+
+    def refresh_facets(self, refresh=False):
+        """Recount the facet sidebar for the current filter, off the Tk thread"""
+        if not self.show_facets or not self.engine.is_connected:
+            return
+
+        search_filter = self.current_filter()
+        counts = self.facet_counter.cached(search_filter, refresh)
+        if counts is not None:
+            self.update_facets(search_filter, counts)
+            return
+
+        # A newer filter makes any count still running useless
+        self.facet_counter.cancel()
+
+        def load_in_thread():
+            try:
+                counts = self.facet_counter.get(search_filter, refresh)
+                if counts is not None:
+                    self.root.after(0, self.update_facets, search_filter, counts)
+            except Exception as e:
+                self.root.after(0, lambda: self.status_var.set(f"Facet error: {str(e)}"))
+
+        threading.Thread(target=load_in_thread, daemon=True).start()
+
+    def update_facets(self, search_filter, counts):
+        if search_filter.key() != self.current_filter().key():
+            return
+
+        self.facet_tree.delete(*self.facet_tree.get_children())
+        self.facet_items = {}
+        for name in FACET_ORDER:
+            label = FACET_LABELS[name]
+            if name in self.facets:
+                selected = self.facets[name]
+                label = f"{label}: {self.facet_value_label(selected)} (click to clear)"
+            parent = self.facet_tree.insert('', tk.END, text=label, open=True)
+            self.facet_items[parent] = (name, None, True)
+
+            for value, count in counts.get(name, []):
+                item_id = self.facet_tree.insert(parent, tk.END, text=self.facet_value_label(value),
+                                                 values=(count,))
+                self.facet_items[item_id] = (name, value, False)
+
+    @staticmethod
+    def facet_value_label(value):
+        return value if value else "(unknown)"
+
+    def on_facet_select(self, event):
+        selection = self.facet_tree.selection()
+        if not selection or selection[0] not in self.facet_items:
+            return
+        name, value, is_group = self.facet_items[selection[0]]
+
+        if is_group:
+            if name not in self.facets:
+                return
+            del self.facets[name]
+        else:
+            self.facets[name] = value
+
+        self.result_set_label = None
+        self.timeline_cursor = None
+        self.current_offset = 0
+        self.has_more_data = True
+        self.tree.delete(*self.tree.get_children())
+        self.load_images(initial_load=True)
+        if self.timeline_mode:
+            self.refresh_timeline()
+        self.refresh_facets()
+
+    def on_scrollbar(self, *args):
+        self.tree.yview(*args)
+        self.record_tree_scroll()
+
+    def on_tree_wheel(self, event):
+        # The Treeview class binding scrolls after this one
+        if self.recorder:
+            self.root.after_idle(self.record_tree_scroll)
+
+    def record_tree_scroll(self):
+        """Record a scroll the user made; scrolling caused by loading rows is not recorded"""
+        if self.recorder:
+            first, last = self.tree.yview()
+            self.recorder.record('on_tree_scroll', first=float(first), last=float(last))
+
     def on_tree_scroll(self, *args):
         self.v_scrollbar.set(*args)
 
@@ -499,35 +1485,55 @@ class MediaBrowser:
 
     def update_treeview(self, rows, has_more_data, initial_load):
         try:
+            if initial_load:
+                live_items = {row[0] for row in rows}
+                self.item_sources = {item_id: source for item_id, source in self.item_sources.items()
+                                     if item_id in live_items}
+
             images_loaded = 0
             for row in rows:
-                abs_filename, rel_filename, preview, caption, exif = row
+                if self.insert_row(row):
+                    images_loaded += 1
 
-                if self.hide_no_preview and preview is None:
-                    continue
+            self.has_more_data = has_more_data
+            self.is_loading = False
+            self.update_loaded_status(has_more_data)
+
+        except Exception as e:
+            self.is_loading = False
+            self.status_var.set(f"Error updating treeview: {str(e)}")
 
-                thumbnail = self.create_thumbnail(preview, exif_json=exif) if preview else None
+    def insert_row(self, row, index=tk.END, parent=''):
+        """Insert one (abs_filename, rel_filename, preview, caption, exif) row; False if filtered out"""
+        abs_filename, rel_filename, preview, caption, exif = row
 
-                item_id = self.tree.insert('', tk.END,
-                                           text='',
-                                           values=(rel_filename,),
-                                           iid=abs_filename)
+        if self.hide_no_preview and preview is None:
+            return False
 
-                if thumbnail:
-                    self.tree.item(item_id, image=thumbnail)
-                    self.thumbnail_photos[abs_filename] = thumbnail
+        thumbnail = self.create_thumbnail(preview, exif_json=exif) if preview else None
 
-                images_loaded += 1
+        item_id = self.tree.insert(parent, index,
+                                   text='',
+                                   values=(rel_filename,),
+                                   tags=self.availability_tags(rel_filename),
+                                   iid=abs_filename)
 
-            self.has_more_data = has_more_data
-            self.is_loading = False
+        if thumbnail:
+            self.tree.item(item_id, image=thumbnail)
+            self.thumbnail_photos[abs_filename] = thumbnail
 
+        return True
+
+    def update_loaded_status(self, has_more_data, suffix=None):
+        try:
             total_count = len(self.tree.get_children())
 
             status_parts = []
             status_parts.append(f"Loaded {total_count} images")
 
-            if self.current_search:
+            if self.result_set_label:
+                status_parts.append(self.result_set_label)
+            elif self.current_search:
                 status_parts.append(f"for '{self.current_search}'")
 
             if self.hide_no_preview:
@@ -536,11 +1542,16 @@ class MediaBrowser:
             if has_more_data:
                 status_parts.append("(scroll to load more)")
 
+            if self.fanout and self.fanout.errors:
+                status_parts.append(f"({len(self.fanout.errors)} sources unavailable)")
+
+            if suffix:
+                status_parts.append(suffix)
+
             self.status_var.set(" ".join(status_parts))
 
         except Exception as e:
-            self.is_loading = False
-            self.status_var.set(f"Error updating treeview: {str(e)}")
+            self.status_var.set(f"Error updating status: {str(e)}")
 
     def parse_exif_data(self, exif_json):
         if not exif_json:
@@ -554,6 +1565,10 @@ class MediaBrowser:
             else:
                 exif_dict = exif_json
 
+            coordinates = gps_from_exif(exif_dict)
+            if coordinates:
+                exif_data.append(("GPS Position", f"{coordinates[0]:.6f}, {coordinates[1]:.6f}"))
+
             for key, value in exif_dict.items():
                 if value not in (None, '', []):
                     display_key = key.replace('_', ' ').title()
@@ -580,44 +1595,59 @@ class MediaBrowser:
 
     def on_select(self, event):
         selection = self.tree.selection()
-        if not selection:
+        if not selection or is_folder_item(selection[0]):
             self.show_in_folder_button.config(state="disabled")
             self.open_in_viewer_button.config(state="disabled")
+            self.zoom_original_button.config(state="disabled")
+            if selection and selection[0].startswith(MORE_PREFIX):
+                self.load_more_folder_files(selection[0])
             return
 
-        abs_filename = selection[0]
+        engine, abs_filename = self.engine_for_item(selection[0])
         self.selected_abs_filename = abs_filename
+        if self.recorder:
+            self.recorder.record('on_select', index=self.tree.index(selection[0]), item=selection[0])
         self.show_in_folder_button.config(state="normal")
         self.open_in_viewer_button.config(state="normal")
+        self.zoom_original_button.config(state="normal")
+
+        # Arrowing through the list replaces the pending request rather than starting a fetch per row
+        with self.preview_lock:
+            self.preview_request = (engine, abs_filename)
+            if self.preview_worker_busy:
+                return
+            self.preview_worker_busy = True
+        threading.Thread(target=self.preview_worker, daemon=True).start()
+
+    def preview_worker(self):
+        """Fetch the preview of the latest selection, dropping selections superseded meanwhile"""
+        while True:
+            with self.preview_lock:
+                request, self.preview_request = self.preview_request, None
+                if request is None:
+                    self.preview_worker_busy = False
+                    return
+            engine, abs_filename = request
 
-        def load_preview_in_thread():
             try:
-                cur = self.conn.cursor()
-                cur.execute("""
-                        SELECT rel_filename, preview, latest_caption, exif 
-                        FROM dm.col_images 
-                        WHERE abs_filename = %s
-                    """, (abs_filename,))
-                result = cur.fetchone()
-                cur.close()
-
-                if result:
-                    rel_filename, preview, caption, exif = result
-                    self.selected_rel_filename = rel_filename
-
-                    if preview:
-                        image = Image.open(io.BytesIO(preview))
-                        if exif:
-                            image = self.apply_exif_orientation(image, exif)
-                        self.root.after(0, self.update_preview, image, caption, abs_filename, exif)
-                    else:
-                        self.root.after(0, self.update_preview, None, caption, abs_filename, exif)
+                result = engine.fetch_preview(abs_filename, cache=self.preview_cache)
+                if not result or self.preview_request is not None:
+                    continue
+
+                rel_filename, preview, caption, exif = result
+                self.selected_rel_filename = rel_filename
+
+                if preview:
+                    image = Image.open(io.BytesIO(preview))
+                    if exif:
+                        image = self.apply_exif_orientation(image, exif)
+                    self.root.after(0, self.update_preview, image, caption, abs_filename, exif)
+                else:
+                    self.root.after(0, self.update_preview, None, caption, abs_filename, exif)
 
             except Exception as e:
                 self.root.after(0, lambda: self.status_var.set(f"Preview error: {str(e)}"))
 
-        threading.Thread(target=load_preview_in_thread, daemon=True).start()
-
     def update_preview(self, image, caption, filename, exif):
         self.current_pil_image = image
         self.current_image_data = (caption, filename)
@@ -636,12 +1666,16 @@ class MediaBrowser:
         self.caption_text.delete(1.0, tk.END)
         self.caption_text.insert(1.0, caption or "No caption")
 
+        self.selected_gps = gps_from_exif(exif)
         self.update_exif_panel(exif)
 
         short_name = filename.split('/')[-1] if '/' in filename else filename
         self.status_var.set(f"Preview: {short_name}")
 
     def on_preview_resize(self, event):
+        if self.recorder:
+            self.recorder.record('on_preview_resize', width=event.width, height=event.height,
+                                 window=[self.root.winfo_width(), self.root.winfo_height()])
         if self.current_pil_image:
             self.resize_and_display_image()
 
@@ -0,0 +1,349 @@
+import io
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from config import CONFIG_DIR
+
+INDEX_FILE = CONFIG_DIR / 'phash_index.npz'
+
+HASH_KINDS = ('ahash', 'dhash', 'phash')
+
+
+def _pack_bits(bits):
+    """Pack a flat boolean array of 64 bits into an unsigned 64-bit integer"""
+    return int(np.packbits(bits.astype(np.uint8)).view('>u8')[0])
+
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _runs(sorted_values):
+    """Yield (start, stop) of every run of equal values longer than one element"""
+    boundaries = np.flatnonzero(np.diff(sorted_values)) + 1
+    starts = np.concatenate([[0], boundaries])
+    stops = np.concatenate([boundaries, [len(sorted_values)]])
+    repeated = stops - starts > 1
+    return zip(starts[repeated].tolist(), stops[repeated].tolist())
+
+
+def compute_hashes(preview_data):
+    """Return (ahash, dhash, phash) of an image blob as unsigned 64-bit integers"""
+    image = Image.open(io.BytesIO(preview_data))
+    image.draft('L', (64, 64))
+    gray = image.convert('L')
+
+    small = np.asarray(gray.resize((8, 8), Image.Resampling.BOX), dtype=np.float32)
+    ahash = _pack_bits(small > small.mean())
+
+    wide = np.asarray(gray.resize((9, 8), Image.Resampling.BOX), dtype=np.float32)
+    dhash = _pack_bits(wide[:, 1:] > wide[:, :-1])
+
+    pixels = np.asarray(gray.resize((32, 32), Image.Resampling.BOX), dtype=np.float64)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8].flatten()
+    phash = _pack_bits(low > np.median(low[1:]))
+
+    return ahash, dhash, phash
+
+
+class PreviewHashIndex:
+    """Perceptual hashes of the `preview` blobs, kept in a local NumPy index.
+
+    Building fetches only the previews that are not indexed yet, in batches on
+    its own connection, and hashes them on a thread pool.
+    Queries are vectorized Hamming distances over the whole hash column.
+    """
+
+    def __init__(self, connect, index_file=INDEX_FILE, workers=None, fetch_size=500):
+        self.connect = connect
+        self.index_file = index_file
+        self.workers = workers
+        self.fetch_size = fetch_size
+
+        self.lock = threading.Lock()
+        self.keys = np.empty(0, dtype=object)
+        self.hashes = {kind: np.empty(0, dtype=np.uint64) for kind in HASH_KINDS}
+        self.positions = {}
+        self.is_building = False
+        self.cancel_event = threading.Event()
+
+        self.load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def load(self):
+        """Load index from file"""
+        if not self.index_file.exists():
+            return
+        try:
+            with np.load(self.index_file, allow_pickle=True) as data:
+                keys = data['keys']
+                hashes = {kind: data[kind] for kind in HASH_KINDS}
+            with self.lock:
+                self.keys = keys
+                self.hashes = hashes
+                self.positions = {key: i for i, key in enumerate(keys.tolist())}
+        except Exception as e:
+            print(f"Error loading hash index: {e}")
+
+    def save(self):
+        """Save index to file"""
+        try:
+            CONFIG_DIR.mkdir(exist_ok=True, parents=True)
+            with self.lock:
+                keys = self.keys
+                hashes = dict(self.hashes)
+            tmp_file = self.index_file.with_suffix('.tmp.npz')
+            np.savez(tmp_file, keys=keys, **hashes)
+            tmp_file.replace(self.index_file)
+            return True
+        except Exception as e:
+            print(f"Error saving hash index: {e}")
+            return False
+
+    def clear(self):
+        with self.lock:
+            self.keys = np.empty(0, dtype=object)
+            self.hashes = {kind: np.empty(0, dtype=np.uint64) for kind in HASH_KINDS}
+            self.positions = {}
+
+    def build(self, progress=None):
+        """Hash every preview missing from the index.
+
+        `progress(done, total)` is called from the worker thread after each batch.
+        Returns the number of newly indexed previews.
+        """
+        if self.is_building:
+            return 0
+
+        self.is_building = True
+        self.cancel_event.clear()
+        conn = None
+        added = 0
+        try:
+            conn = self.connect()
+
+            cur = conn.cursor()
+            cur.execute("SELECT abs_filename FROM dm.col_images WHERE preview IS NOT NULL")
+            server_keys = [row[0] for row in cur.fetchall()]
+            cur.close()
+
+            with self.lock:
+                missing = [key for key in server_keys if key not in self.positions]
+            total = len(missing)
+            if progress:
+                progress(0, total)
+            if not missing:
+                return 0
+
+            def hash_row(row):
+                abs_filename, preview = row
+                try:
+                    return abs_filename, compute_hashes(bytes(preview))
+                except Exception as e:
+                    print(f"Error hashing {abs_filename}: {e}")
+                    return abs_filename, None
+
+            cur = conn.cursor()
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for start in range(0, total, self.fetch_size):
+                    if self.cancel_event.is_set():
+                        break
+
+                    cur.execute(
+                        "SELECT abs_filename, preview FROM dm.col_images WHERE abs_filename = ANY(%s)",
+                        (missing[start:start + self.fetch_size],)
+                    )
+                    rows = cur.fetchall()
+
+                    results = [(key, h) for key, h in pool.map(hash_row, rows) if h is not None]
+                    self._append(results)
+                    added += len(rows)
+                    if progress:
+                        progress(added, total)
+
+            cur.close()
+            self.save()
+            return added
+
+        finally:
+            if conn:
+                try:
+                    conn.close()
+                except:
+                    pass
+            self.is_building = False
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _append(self, results):
+        if not results:
+            return
+        new_keys = np.array([key for key, _ in results], dtype=object)
+        new_hashes = np.array([h for _, h in results], dtype=np.uint64)
+        with self.lock:
+            start = len(self.keys)
+            self.positions.update((key, start + i) for i, key in enumerate(new_keys.tolist()))
+            self.keys = np.concatenate([self.keys, new_keys])
+            for i, kind in enumerate(HASH_KINDS):
+                self.hashes[kind] = np.concatenate([self.hashes[kind], new_hashes[:, i]])
+
+    def distances(self, abs_filename, kind='dhash'):
+        """Hamming distance from the given image to every indexed image"""
+        with self.lock:
+            keys = self.keys
+            hashes = self.hashes[kind]
+            position = self.positions.get(abs_filename)
+        if position is None:
+            return keys, None
+        return keys, np.bitwise_count(hashes ^ hashes[position])
+
+    def find_similar(self, abs_filename, max_distance=10, limit=200, kind='dhash'):
+        """Return [(abs_filename, distance)] of images close to the given one, nearest first"""
+        keys, distances = self.distances(abs_filename, kind)
+        if distances is None:
+            return []
+
+        candidates = np.flatnonzero(distances <= max_distance)
+        if len(candidates) > limit:
+            nearest = np.argpartition(distances[candidates], limit - 1)[:limit]
+            candidates = candidates[nearest]
+        candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+        return [(keys[i], int(distances[i])) for i in candidates]
+
+    def duplicate_clusters(self, max_distance=0, kind='dhash', progress=None, cancel_event=None):
+        """Group images whose hashes are within `max_distance` bits of each other.
+
+        Uses multi-index hashing: the 64 bits are split into `max_distance + k`
+        bands, so any two hashes within the distance agree exactly on at least
+        k bands. One table per combination of k bands is sorted on those bits,
+        and only hashes sharing a table key are compared bit by bit; the close
+        pairs are joined into clusters with scipy's connected components.
+        k grows with the index size so each key stays selective.
+        The number of tables grows steeply with the distance: on 2M distinct
+        hashes distance 1-3 takes under a second, 4 about 1.5 s on one core.
+        `progress(done, total)` is called after each table; if `cancel_event`
+        gets set the search stops and None is returned.
+        Returns a list of key lists, largest cluster first.
+        """
+        with self.lock:
+            keys = self.keys
+            hashes = self.hashes[kind]
+        count = len(hashes)
+        if count < 2:
+            return []
+
+        # Identical hashes always share a cluster, so only distinct values are banded
+        unique_hashes, roots = np.unique(hashes, return_inverse=True)
+        if max_distance > 0:
+            band_roots = self._band_clusters(unique_hashes, max_distance, progress, cancel_event,
+                                             workers=self.workers)
+            if band_roots is None:
+                return None
+            roots = band_roots[roots]
+
+        order = np.argsort(roots, kind='stable')
+        clusters = [keys[order[start:stop]].tolist() for start, stop in _runs(roots[order])]
+        clusters.sort(key=len, reverse=True)
+        return clusters
+
+    @staticmethod
+    def band_tables(max_distance, count):
+        """Bands of the multi-index tables for a distance and index size.
+
+        With `max_distance + k` bands every pair within the distance matches
+        exactly on some k bands. k is the smallest value that gives keys of
+        about log2(count) bits, so a key is shared by few unrelated hashes.
+        Returns one list of (shift, width) bands per table.
+        """
+        target_bits = min(max(int(np.ceil(np.log2(max(count, 2)))), 16), 48)
+        k = 1
+        while 64 * k / (max_distance + k) < target_bits and k < 64 - max_distance:
+            k += 1
+        edges = np.linspace(0, 64, max_distance + k + 1).astype(int)
+        bands = [(int(64 - stop), int(stop - start)) for start, stop in zip(edges[:-1], edges[1:])]
+        return [[bands[i] for i in combination]
+                for combination in itertools.combinations(range(len(bands)), k)]
+
+    @staticmethod
+    def _band_pairs(hashes, bands, max_distance):
+        """Positions (first, second) of hashes equal on the given bands and within the distance"""
+        count = len(hashes)
+        index_bits = max(1, (count - 1).bit_length())
+
+        key = None
+        key_bits = 0
+        for shift, width in bands:
+            part = (hashes >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+            key = part if key is None else (key << np.uint64(width)) | part
+            key_bits += width
+        # Key and position share one word, so a plain sort groups the keys. Dropping
+        # low key bits only lets more unrelated hashes through to the distance check
+        if key_bits + index_bits > 64:
+            key >>= np.uint64(key_bits + index_bits - 64)
+        key <<= np.uint64(index_bits)
+        key |= np.arange(count, dtype=np.uint64)
+        key.sort()
+        # Two packed words have the same key when they differ only in the position bits
+        same_key = np.uint64(1 << index_bits)
+        position_mask = np.uint64((1 << index_bits) - 1)
+
+        # Pairs `shift` places apart in a run of equal keys; each shift only
+        # rechecks the places that still matched at the previous one
+        firsts, seconds = [], []
+        candidates = np.flatnonzero((key[1:] ^ key[:-1]) < same_key)
+        shift = 1
+        while len(candidates):
+            first = (key[candidates] & position_mask).astype(np.intp)
+            second = (key[candidates + shift] & position_mask).astype(np.intp)
+            close = np.bitwise_count(hashes[first] ^ hashes[second]) <= max_distance
+            firsts.append(first[close])
+            seconds.append(second[close])
+            shift += 1
+            candidates = candidates[candidates + shift < count]
+            candidates = candidates[(key[candidates] ^ key[candidates + shift]) < same_key]
+        if not firsts:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    @classmethod
+    def _band_clusters(cls, hashes, max_distance, progress=None, cancel_event=None, workers=None):
+        """Connected components of pairs colliding in at least one table; returns a label per hash.
+
+        Tables are independent and numpy releases the GIL while sorting, so
+        they are searched on a thread pool.
+        """
+        tables = cls.band_tables(max_distance, len(hashes))
+        firsts, seconds = [], []
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(cls._band_pairs, hashes, bands, max_distance) for bands in tables]
+            for done, future in enumerate(as_completed(futures)):
+                if cancel_event is not None and cancel_event.is_set():
+                    pool.shutdown(cancel_futures=True)
+                    return None
+                first, second = future.result()
+                firsts.append(first)
+                seconds.append(second)
+                if progress:
+                    progress(done + 1, len(tables))
+
+        first, second = np.concatenate(firsts), np.concatenate(seconds)
+        graph = sparse.coo_matrix((np.ones(len(first), dtype=np.int8), (first, second)),
+                                  shape=(len(hashes), len(hashes)))
+        _, labels = csgraph.connected_components(graph, directed=False)
+        return labels
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from config import CONFIG_DIR
+
+CACHE_DIR = CONFIG_DIR / 'preview_cache'
+
+
+class PreviewCache:
+    """Content-addressed store of preview blobs on local disk.
+
+    Blobs are stored under their MD5 digest, the same value the server
+    computes with md5(preview), so a row only needs its digest to find its
+    preview locally. When the cache grows past `max_bytes` the least
+    recently read blobs are evicted.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats_file = directory / 'stats.json'
+        self.lock = threading.Lock()
+
+        self.entries = {}
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.lifetime_bytes_saved = 0
+
+        self.load()
+
+    def path(self, digest):
+        return self.directory / digest[:2] / digest
+
+    def load(self):
+        """Scan the cache directory and load saved statistics"""
+        if not self.directory.exists():
+            return
+        entries = {}
+        try:
+            for subdir in os.scandir(self.directory):
+                if not subdir.is_dir():
+                    continue
+                for entry in os.scandir(subdir.path):
+                    if entry.is_file() and len(entry.name) == 32:
+                        stat = entry.stat()
+                        entries[entry.name] = [stat.st_size, stat.st_mtime]
+        except OSError as e:
+            print(f"Error scanning preview cache: {e}")
+
+        with self.lock:
+            self.entries = entries
+            self.total_bytes = sum(size for size, _ in entries.values())
+
+        if self.stats_file.exists():
+            try:
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    self.lifetime_bytes_saved = json.load(f).get('bytes_saved', 0)
+            except Exception as e:
+                print(f"Error loading preview cache stats: {e}")
+
+    def save_stats(self):
+        """Save lifetime statistics"""
+        try:
+            self.directory.mkdir(exist_ok=True, parents=True)
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                json.dump({'bytes_saved': self.lifetime_bytes_saved + self.bytes_saved}, f)
+            return True
+        except Exception as e:
+            print(f"Error saving preview cache stats: {e}")
+            return False
+
+    def __contains__(self, digest):
+        return digest in self.entries
+
+    def get(self, digest):
+        """Return the blob as bytes, or None if it is not cached"""
+        with self.lock:
+            entry = self.entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        try:
+            with open(self.path(digest), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.discard(digest)
+            self.misses += 1
+            return None
+
+        now = time.time()
+        with self.lock:
+            entry[1] = now
+            self.hits += 1
+            self.bytes_saved += entry[0]
+        try:
+            os.utime(self.path(digest), (now, now))
+        except OSError:
+            pass
+        return data
+
+    def put(self, digest, data):
+        """Store a blob under its digest; blobs that do not match the digest are ignored"""
+        if digest in self.entries:
+            return True
+        if hashlib.md5(data).hexdigest() != digest:
+            return False
+
+        path = self.path(digest)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing preview cache: {e}")
+            return False
+
+        with self.lock:
+            if digest not in self.entries:
+                self.entries[digest] = [len(data), time.time()]
+                self.total_bytes += len(data)
+            over_limit = self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+        return True
+
+    def discard(self, digest):
+        with self.lock:
+            entry = self.entries.pop(digest, None)
+            if entry:
+                self.total_bytes -= entry[0]
+        try:
+            os.remove(self.path(digest))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove least recently used blobs until the cache is at 90% of its limit"""
+        with self.lock:
+            target = self.max_bytes * 0.9
+            oldest = sorted(self.entries.items(), key=lambda item: item[1][1])
+            victims = []
+            for digest, (size, _) in oldest:
+                if self.total_bytes <= target:
+                    break
+                del self.entries[digest]
+                self.total_bytes -= size
+                victims.append(digest)
+
+        for digest in victims:
+            try:
+                os.remove(self.path(digest))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self.lock:
+            digests = list(self.entries)
+            self.entries = {}
+            self.total_bytes = 0
+        for digest in digests:
+            try:
+                os.remove(self.path(digest))
+            except OSError:
+                pass
+
+    def summary(self):
+        """Short human-readable statistics"""
+        saved_mb = (self.lifetime_bytes_saved + self.bytes_saved) / (1024 * 1024)
+        size_mb = self.total_bytes / (1024 * 1024)
+        return (f"Preview cache: {len(self.entries)} blobs, {size_mb:.1f} MB; "
+                f"{self.hits} hits / {self.misses} misses this session, {saved_mb:.1f} MB saved in total")
@@ -0,0 +1,470 @@
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+ROW_COLUMNS = "abs_filename, rel_filename, preview, latest_caption, exif"
+
+# EXIF dates are stored as 'YYYY:MM:DD HH:MM:SS', which sorts correctly as text
+# under the C collation. Rows without a date sort last in descending order.
+# Seek queries can walk an index such as:
+#   CREATE INDEX ON dm.col_images ((<CAPTURE_DATE_SQL>) DESC, rel_filename DESC);
+CAPTURE_DATE_SQL = (
+    "coalesce(exif->>'EXIF DateTimeOriginal', exif->>'Image DateTime', '') COLLATE \"C\""
+)
+
+# Pages merged across several servers order filenames by code point, whatever
+# each database's collation, so they can be merged with Python's str comparison.
+# Single-source lists keep the database collation and the plain rel_filename index;
+# with several sources configured, merged seek pages can walk an index such as:
+#   CREATE INDEX ON dm.col_images ((<REL_FILENAME_SQL>) DESC, (<ABS_FILENAME_SQL>) DESC);
+REL_FILENAME_SQL = 'rel_filename COLLATE "C"'
+ABS_FILENAME_SQL = 'abs_filename COLLATE "C"'
+
+ORDER_FILENAME = 'filename'
+ORDER_TIMELINE = 'timeline'
+
+# Facets matched on an exact value. A missing value (NULL, or '' for the
+# year of undated rows) is a value of its own.
+FACET_SQL = {
+    'camera': "exif->>'Image Model'",
+    'lens': "exif->>'EXIF LensModel'",
+    'year': f"substr({CAPTURE_DATE_SQL}, 1, 4)",
+}
+# The folder facet is a rel_filename prefix such as '2019/Trip'
+FACET_FOLDER = 'folder'
+
+
+def like_prefix(prefix):
+    """LIKE pattern matching strings that start with `prefix` literally"""
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+class SearchFilter:
+    """Search text and filters that select rows from dm.col_images"""
+
+    def __init__(self, search="", hide_no_preview=False, facets=None):
+        self.search = search
+        self.hide_no_preview = hide_no_preview
+        self.facets = dict(facets or {})
+
+    def where_clause(self):
+        """Return the WHERE clause and its parameters"""
+        where_clauses = []
+        params = []
+
+        if self.search:
+            where_clauses.append(
+                "(latest_caption ILIKE %s OR exif::text ILIKE %s OR rel_filename ILIKE %s)"
+            )
+            search_param = f'%{self.search}%'
+            params.extend([search_param, search_param, search_param])
+
+        if self.hide_no_preview:
+            where_clauses.append("preview IS NOT NULL")
+
+        for name, value in sorted(self.facets.items()):
+            if name == FACET_FOLDER:
+                where_clauses.append("rel_filename LIKE %s")
+                params.append(like_prefix(value + '/'))
+            elif value is None:
+                where_clauses.append(f"({FACET_SQL[name]}) IS NULL")
+            else:
+                where_clauses.append(f"({FACET_SQL[name]}) = %s")
+                params.append(value)
+
+        where_clause = ""
+        if where_clauses:
+            where_clause = "WHERE " + " AND ".join(where_clauses)
+
+        return where_clause, params
+
+    def to_dict(self):
+        data = {'search': self.search, 'hide_no_preview': self.hide_no_preview}
+        if self.facets:
+            data['facets'] = dict(self.facets)
+        return data
+
+    def without_facet(self, name):
+        facets = {key: value for key, value in self.facets.items() if key != name}
+        return SearchFilter(self.search, self.hide_no_preview, facets)
+
+    def key(self):
+        """Stable string identifying the filter state, for cache keys"""
+        return json.dumps(self.to_dict(), sort_keys=True, ensure_ascii=False)
+
+
+def prefix_range(prefix):
+    """(lower, upper) bounds of the strings starting with a folder prefix ending in '/'.
+
+    Compared with the ~>=~ and ~<~ operators the range can be answered from
+      CREATE INDEX ON dm.col_images (rel_filename text_pattern_ops);
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def add_condition(where_clause, condition):
+    if where_clause:
+        return f"{where_clause} AND {condition}"
+    return f"WHERE {condition}"
+
+
+class QueryEngine:
+    """Data access for dm.col_images, independent of any UI.
+
+    Short queries borrow a connection from a thread-safe pool, so page loads,
+    preview fetches and aggregates can run concurrently; when every pooled
+    connection is in use, callers wait for one instead of failing. Long
+    streams and background workers get a dedicated connection from
+    `create_connection`.
+    """
+
+    def __init__(self, db_config, max_connections=4, connect_timeout=10):
+        self.db_config = dict(db_config)
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.pool = None
+        self.pool_slots = None
+        self.lock = threading.Lock()
+
+    def connect_kwargs(self):
+        return dict(
+            host=self.db_config["host"],
+            port=self.db_config.get("port", "5432"),
+            database=self.db_config["database"],
+            user=self.db_config["user"],
+            password=self.db_config["password"],
+            connect_timeout=self.connect_timeout
+        )
+
+    def create_connection(self):
+        """Open a new connection outside the pool; the caller closes it"""
+        return psycopg2.connect(**self.connect_kwargs())
+
+    def connect(self):
+        """(Re)create the pool and check the server answers; raises on failure"""
+        self.close()
+        pool = ThreadedConnectionPool(1, self.max_connections, **self.connect_kwargs())
+        with self.lock:
+            self.pool = pool
+            self.pool_slots = threading.BoundedSemaphore(self.max_connections)
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+
+    @property
+    def is_connected(self):
+        return self.pool is not None
+
+    def close(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool:
+            try:
+                pool.closeall()
+            except:
+                pass
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, waiting while all are in use; its transaction is ended on return"""
+        with self.lock:
+            pool, slots = self.pool, self.pool_slots
+        if pool is None:
+            raise RuntimeError("Not connected to database")
+
+        # getconn raises PoolError once max_connections are out, so queue for a slot first
+        slots.acquire()
+        try:
+            conn = pool.getconn()
+            try:
+                yield conn
+            finally:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pool.putconn(conn, close=True)
+                else:
+                    pool.putconn(conn)
+        finally:
+            slots.release()
+
+    def fetch_page(self, search_filter, limit=100, offset=0, order=ORDER_FILENAME, cursor=None, seek=False):
+        """Fetch one page of rows.
+
+        ORDER_FILENAME pages with OFFSET unless `seek` is set; ORDER_TIMELINE
+        always seeks. Seeking continues after `cursor`, the sort key of the
+        last row of the previous page. Returns (rows, next_cursor) where rows
+        are (abs_filename, rel_filename, preview, latest_caption, exif).
+        """
+        if order == ORDER_TIMELINE or seek:
+            keyed_rows = self.fetch_keyed_page(search_filter, limit, order, cursor)
+            next_cursor = keyed_rows[-1][0] if keyed_rows else None
+            return [row for _, row in keyed_rows], next_cursor
+
+        where_clause, params = search_filter.where_clause()
+        query = f"""
+        SELECT {ROW_COLUMNS}
+        FROM dm.col_images
+        {where_clause}
+        ORDER BY rel_filename desc
+        LIMIT %s OFFSET %s
+        """
+        params.extend([limit, offset])
+
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            cur.close()
+        return rows, None
+
+    def fetch_keyed_page(self, search_filter, limit=100, order=ORDER_FILENAME, cursor=None,
+                         code_point_order=False):
+        """Fetch one page by seeking past `cursor`; returns [(sort_key, row)].
+
+        The sort key is (capture_date, rel_filename) for ORDER_TIMELINE and
+        (rel_filename, abs_filename) otherwise, both descending. With
+        `code_point_order` filenames sort under COLLATE "C", for merging.
+        """
+        where_clause, params = search_filter.where_clause()
+
+        rel_filename, abs_filename = 'rel_filename', 'abs_filename'
+        if code_point_order:
+            rel_filename, abs_filename = REL_FILENAME_SQL, ABS_FILENAME_SQL
+
+        if order == ORDER_TIMELINE:
+            sort_columns = f"{CAPTURE_DATE_SQL}, {rel_filename}"
+            order_by = f"{CAPTURE_DATE_SQL} desc, {rel_filename} desc"
+        else:
+            sort_columns = f"{rel_filename}, {abs_filename}"
+            order_by = f"{rel_filename} desc, {abs_filename} desc"
+
+        if cursor:
+            where_clause = add_condition(where_clause, f"({sort_columns}) < (%s, %s)")
+            params.extend(cursor)
+
+        query = f"""
+        SELECT {ROW_COLUMNS}, {sort_columns}
+        FROM dm.col_images
+        {where_clause}
+        ORDER BY {order_by}
+        LIMIT %s
+        """
+        params.append(limit)
+
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            cur.close()
+        return [(tuple(row[5:7]), row[:5]) for row in rows]
+
+    def fetch_rows(self, abs_filenames):
+        """Fetch rows by key, in the order of the given keys"""
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT {ROW_COLUMNS}
+                FROM dm.col_images
+                WHERE abs_filename = ANY(%s)
+            """, (list(abs_filenames),))
+            rows = cur.fetchall()
+            cur.close()
+
+        positions = {key: i for i, key in enumerate(abs_filenames)}
+        rows.sort(key=lambda row: positions[row[0]])
+        return rows
+
+    def fetch_preview(self, abs_filename, cache=None):
+        """Return (rel_filename, preview, latest_caption, exif) or None.
+
+        With a PreviewCache the row is fetched with md5(preview) instead of the
+        blob, and the blob is transferred only when the cache does not have it.
+        """
+        if cache is None:
+            with self.connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT rel_filename, preview, latest_caption, exif
+                    FROM dm.col_images
+                    WHERE abs_filename = %s
+                """, (abs_filename,))
+                result = cur.fetchone()
+                cur.close()
+            return result
+
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT rel_filename, md5(preview), latest_caption, exif
+                FROM dm.col_images
+                WHERE abs_filename = %s
+            """, (abs_filename,))
+            result = cur.fetchone()
+            if result is None or result[1] is None:
+                cur.close()
+                return result
+
+            rel_filename, digest, caption, exif = result
+            preview = cache.get(digest)
+            if preview is None:
+                cur.execute("SELECT preview FROM dm.col_images WHERE abs_filename = %s", (abs_filename,))
+                row = cur.fetchone()
+                preview = row[0] if row else None
+                if preview is not None:
+                    preview = bytes(preview)
+                    cache.put(digest, preview)
+            cur.close()
+        return rel_filename, preview, caption, exif
+
+    def fetch_digest_page(self, search_filter, limit=100):
+        """First page in filename order with md5(preview) in place of the blob.
+
+        Rows are (abs_filename, rel_filename, preview_md5, latest_caption, exif).
+        """
+        where_clause, params = search_filter.where_clause()
+        params.append(limit)
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT abs_filename, rel_filename, md5(preview), latest_caption, exif
+                FROM dm.col_images
+                {where_clause}
+                ORDER BY rel_filename desc
+                LIMIT %s
+            """, params)
+            rows = cur.fetchall()
+            cur.close()
+        return rows
+
+    def fetch_previews(self, abs_filenames):
+        """Return [(abs_filename, preview_md5, preview)] for the given keys"""
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT abs_filename, md5(preview), preview
+                FROM dm.col_images
+                WHERE abs_filename = ANY(%s)
+            """, (list(abs_filenames),))
+            rows = cur.fetchall()
+            cur.close()
+        return rows
+
+    def _folder_where(self, search_filter, prefix):
+        """WHERE clause for rows below `prefix` ('' for the root, else 'a/b/')"""
+        where_clause, params = search_filter.where_clause()
+        if prefix:
+            where_clause = add_condition(where_clause, "rel_filename ~>=~ %s AND rel_filename ~<~ %s")
+            params.extend(prefix_range(prefix))
+        return where_clause, params
+
+    def fetch_subfolders(self, search_filter, prefix=""):
+        """Immediate subfolders of `prefix` with the number of matching files below each.
+
+        Returns [(name, count)] sorted by name.
+        """
+        start = len(prefix) + 1
+        where_clause, params = self._folder_where(search_filter, prefix)
+        where_clause = add_condition(where_clause, "strpos(substr(rel_filename, %s), '/') > 0")
+        params = [start] + params + [start]
+
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT split_part(substr(rel_filename, %s), '/', 1) AS name, count(*)
+                FROM dm.col_images
+                {where_clause}
+                GROUP BY 1
+                ORDER BY 1
+            """, params)
+            rows = cur.fetchall()
+            cur.close()
+        return rows
+
+    def fetch_folder_files(self, search_filter, prefix="", limit=100, after=None):
+        """Rows directly in the folder `prefix`, by rel_filename, continuing after the name `after`"""
+        start = len(prefix) + 1
+        where_clause, params = self._folder_where(search_filter, prefix)
+        where_clause = add_condition(where_clause, "strpos(substr(rel_filename, %s), '/') = 0")
+        params.append(start)
+        if after is not None:
+            where_clause = add_condition(where_clause, "rel_filename ~>~ %s")
+            params.append(after)
+        params.append(limit)
+
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT {ROW_COLUMNS}
+                FROM dm.col_images
+                {where_clause}
+                ORDER BY rel_filename USING ~<~
+                LIMIT %s
+            """, params)
+            rows = cur.fetchall()
+            cur.close()
+        return rows
+
+    def count(self, search_filter):
+        where_clause, params = search_filter.where_clause()
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT count(*) FROM dm.col_images {where_clause}", params)
+            result = cur.fetchone()[0]
+            cur.close()
+        return result
+
+    def _stream_query(self, search_filter, columns, order):
+        where_clause, params = search_filter.where_clause()
+        if order == ORDER_TIMELINE:
+            order_by = f"{CAPTURE_DATE_SQL} desc, rel_filename desc"
+        else:
+            order_by = "rel_filename desc"
+        return f"""
+            SELECT {columns}
+            FROM dm.col_images
+            {where_clause}
+            ORDER BY {order_by}
+        """, params
+
+    def iter_rows(self, search_filter, columns=ROW_COLUMNS, order=ORDER_FILENAME, fetch_size=500):
+        """Yield every matching row through a server-side cursor on a dedicated connection"""
+        query, params = self._stream_query(search_filter, columns, order)
+        conn = self.create_connection()
+        try:
+            cur = conn.cursor(name='mediabrowser_stream')
+            cur.itersize = fetch_size
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield from rows
+            cur.close()
+        finally:
+            conn.close()
+
+    async def aiter_rows(self, search_filter, columns=ROW_COLUMNS, order=ORDER_FILENAME, fetch_size=500):
+        """Async variant of iter_rows; blocking fetches run in the default executor"""
+        loop = asyncio.get_running_loop()
+        query, params = self._stream_query(search_filter, columns, order)
+        conn = await loop.run_in_executor(None, self.create_connection)
+        try:
+            cur = conn.cursor(name='mediabrowser_stream')
+            cur.itersize = fetch_size
+            await loop.run_in_executor(None, cur.execute, query, params)
+            while True:
+                rows = await loop.run_in_executor(None, cur.fetchmany, fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+            cur.close()
+        finally:
+            await loop.run_in_executor(None, conn.close)
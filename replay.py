@@ -0,0 +1,373 @@
+"""Record UI interactions and replay them to measure end-to-end responsiveness.
+
+Recording: start the browser with MEDIABROWSER_RECORD=trace.jsonl and use it
+normally; scrolling, selection, preview resizes and searches are appended to
+the trace with their time since start.
+
+Replaying needs a display but no window manager, so it runs under Xvfb:
+
+    xvfb-run -a python replay.py trace.jsonl --host localhost --database fixture
+
+The browser starts with an empty settings directory (cold caches) against
+the given database, the trace is played back with its original timing, and
+a JSON report with frame stalls, time-to-preview and time-to-first-row is
+printed. `--create-fixture N` fills an empty database with N synthetic rows
+first, so runs are comparable between machines and releases.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+
+class InteractionRecorder:
+    """Appends UI events as JSON lines: {"t": seconds since start, "event": name, ...}"""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, event, **data):
+        entry = {'t': round(time.monotonic() - self.start, 4), 'event': event}
+        entry.update(data)
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(values):
+    """Milliseconds summary of a list of durations in seconds"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'median_ms': round(percentile(values, 0.5) * 1000, 1),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+        'max_ms': round(max(values) * 1000, 1),
+    }
+
+
+class Replayer:
+    """Plays a trace against a running MediaBrowser and measures what the user would see.
+
+    A heartbeat scheduled every `frame_interval` seconds on the Tk loop
+    measures how late each frame is; gaps over `stall_threshold` are stalls.
+    Time-to-first-row runs from a search (or startup) to the first rows in
+    the list, time-to-preview from a selection to its preview being shown.
+    The app is created with autostart=False and started by `run`, so the
+    startup measurement covers connecting and the initial query.
+    """
+
+    def __init__(self, app, events, speed=1.0, frame_interval=0.016, stall_threshold=0.1, settle=5.0):
+        self.app = app
+        self.root = app.root
+        self.events = events
+        self.speed = speed
+        self.frame_interval = frame_interval
+        self.stall_threshold = stall_threshold
+        self.settle = settle
+
+        self.frame_gaps = []
+        self.stalls = []
+        self.first_rows = []
+        self.previews = []
+        self.skipped = 0
+        self.search_started = None
+        self.pending_previews = {}
+        self.last_frame = None
+        self.done = False
+
+        self._wrap_app()
+
+    def _wrap_app(self):
+        # Results reach the UI through root.after(0, self.update_*), which looks the
+        # method up on the instance, so wrapping the instance attribute sees every call
+        update_treeview = self.app.update_treeview
+        update_preview = self.app.update_preview
+
+        def timed_update_treeview(*args, **kwargs):
+            result = update_treeview(*args, **kwargs)
+            if self.search_started is not None and self.app.tree.get_children():
+                self.first_rows.append(time.monotonic() - self.search_started)
+                self.search_started = None
+            return result
+
+        def timed_update_preview(image, caption, filename, exif):
+            result = update_preview(image, caption, filename, exif)
+            started = self.pending_previews.pop(filename, None)
+            if started is not None:
+                # The preview is on screen once Tk has drawn it
+                self.root.update_idletasks()
+                self.previews.append(time.monotonic() - started)
+            return result
+
+        self.app.update_treeview = timed_update_treeview
+        self.app.update_preview = timed_update_preview
+
+    def run(self):
+        """Replay the trace and return the report; runs the Tk main loop until done"""
+        self.search_started = time.monotonic()
+        self.last_frame = time.monotonic()
+        self.root.after(int(self.frame_interval * 1000), self.heartbeat)
+        self.root.after(0, self.app.start)
+
+        for event in self.events:
+            delay = int(event['t'] / self.speed * 1000)
+            self.root.after(delay, self.dispatch, event)
+
+        end = self.events[-1]['t'] / self.speed if self.events else 0
+        self.root.after(int((end + self.settle) * 1000), self.finish)
+        self.root.mainloop()
+        return self.report()
+
+    def heartbeat(self):
+        if self.done:
+            return
+        now = time.monotonic()
+        gap = now - self.last_frame
+        self.frame_gaps.append(gap)
+        if gap > self.stall_threshold:
+            self.stalls.append(gap)
+        self.last_frame = now
+        self.root.after(int(self.frame_interval * 1000), self.heartbeat)
+
+    def dispatch(self, event):
+        name = event['event']
+        tree = self.app.tree
+
+        if name == 'on_tree_scroll':
+            tree.yview_moveto(event['first'])
+
+        elif name == 'on_select':
+            children = tree.get_children()
+            if event['index'] >= len(children):
+                # The fixture has fewer rows loaded than the recording
+                self.skipped += 1
+                return
+            item = children[event['index']]
+            _, abs_filename = self.app.engine_for_item(item)
+            self.pending_previews[abs_filename] = time.monotonic()
+            tree.selection_set(item)
+            tree.see(item)
+
+        elif name == 'on_preview_resize':
+            width, height = event['window']
+            self.root.geometry(f"{width}x{height}")
+
+        elif name == 'start_search':
+            self.app.search_var.set(event['search'])
+            self.search_started = time.monotonic()
+            self.app.start_search()
+
+    def finish(self):
+        self.done = True
+        self.root.quit()
+
+    def report(self):
+        gaps = self.frame_gaps
+        return {
+            'events': len(self.events),
+            'skipped_events': self.skipped,
+            'frames': len(gaps),
+            'frame_gap_p95_ms': round(percentile(gaps, 0.95) * 1000, 1) if gaps else None,
+            'stalls': len(self.stalls),
+            'longest_stall_ms': round(max(self.stalls) * 1000, 1) if self.stalls else 0,
+            'time_to_first_row': summarize(self.first_rows),
+            'time_to_preview': summarize(self.previews),
+            'previews_never_shown': len(self.pending_previews),
+        }
+
+
+def synthetic_preview(index):
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(index)
+    image = Image.new('RGB', (320, 240), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(8):
+        x, y = rng.randrange(320), rng.randrange(240)
+        draw.rectangle([x, y, x + rng.randrange(20, 120), y + rng.randrange(20, 90)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def create_fixture(conn, count, seed=0):
+    """Create dm.col_images with the columns the browser reads and fill it with `count` rows.
+
+    Does nothing if the table already has rows, so it never touches real data.
+    """
+    from psycopg2.extras import Json, execute_values
+
+    cur = conn.cursor()
+    cur.execute("CREATE SCHEMA IF NOT EXISTS dm")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS dm.col_images (
+            abs_filename text PRIMARY KEY,
+            rel_filename text NOT NULL,
+            preview bytea,
+            latest_caption text,
+            exif jsonb
+        )
+    """)
+    cur.execute("SELECT EXISTS (SELECT 1 FROM dm.col_images)")
+    if cur.fetchone()[0]:
+        conn.commit()
+        cur.close()
+        return 0
+
+    rng = random.Random(seed)
+    cameras = ["Canon EOS 5D Mark IV", "NIKON D750", "ILCE-7M3", "iPhone 12", None]
+    words = ["beach", "mountain", "city", "night", "portrait", "forest", "family", "snow", "river", "market"]
+    batch = []
+    for i in range(count):
+        folder = f"{2010 + i % 14}/{rng.choice(words)}_{i % 37:02d}"
+        rel_filename = f"{folder}/IMG_{i:06d}.JPG"
+        exif = {'EXIF DateTimeOriginal': f"{2010 + i % 14}:{1 + i % 12:02d}:{1 + i % 28:02d} 12:00:00"}
+        camera = rng.choice(cameras)
+        if camera:
+            exif['Image Model'] = camera
+        if i % 3 == 0:
+            exif['GPS GPSLatitude'] = f"[{rng.randrange(60)}, {rng.randrange(60)}, {rng.randrange(6000)}/100]"
+            exif['GPS GPSLatitudeRef'] = rng.choice("NS")
+            exif['GPS GPSLongitude'] = f"[{rng.randrange(180)}, {rng.randrange(60)}, {rng.randrange(6000)}/100]"
+            exif['GPS GPSLongitudeRef'] = rng.choice("EW")
+        preview = synthetic_preview(i) if i % 10 else None
+        caption = " ".join(rng.sample(words, 3))
+        batch.append(('/fixture/' + rel_filename, rel_filename, preview, caption, Json(exif)))
+
+        if len(batch) >= 500:
+            execute_values(cur, "INSERT INTO dm.col_images VALUES %s", batch)
+            batch = []
+    if batch:
+        execute_values(cur, "INSERT INTO dm.col_images VALUES %s", batch)
+
+    conn.commit()
+    cur.close()
+    return count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded UI trace against a fixture database and report responsiveness."
+    )
+    parser.add_argument('trace', nargs='?', help="JSON-lines trace recorded with MEDIABROWSER_RECORD")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="playback speed factor (default: original timing)")
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help="seconds to keep measuring after the last event")
+    parser.add_argument('--stall-ms', type=float, default=100,
+                        help="frame gap counted as a stall")
+    parser.add_argument('--home',
+                        help="settings directory to use (default: a fresh temporary one)")
+    parser.add_argument('--create-fixture', type=int, metavar='N',
+                        help="create and fill dm.col_images with N synthetic rows if it is empty")
+    parser.add_argument('--report', help="also write the JSON report to this file")
+    parser.add_argument('--max-stall-ms', type=float,
+                        help="exit with status 2 if the longest stall exceeds this")
+    parser.add_argument('--max-preview-ms', type=float,
+                        help="exit with status 2 if the p95 time-to-preview exceeds this")
+
+    db_group = parser.add_argument_group("fixture database")
+    db_group.add_argument('--host', default='localhost')
+    db_group.add_argument('--port', default='5432')
+    db_group.add_argument('--database', required=True)
+    db_group.add_argument('--user', default=os.environ.get('PGUSER', ''))
+    db_group.add_argument('--password', default=os.environ.get('PGPASSWORD', ''))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Must be set before config is imported, every cache path derives from it
+    home = args.home or tempfile.mkdtemp(prefix='mediabrowser-replay-')
+    os.environ['MEDIABROWSER_HOME'] = home
+
+    import tkinter as tk
+
+    from config import Config
+    from mediabrowser import MediaBrowser
+    from query_engine import QueryEngine
+
+    db_config = {key: getattr(args, key) for key in ('host', 'port', 'database', 'user', 'password')}
+
+    engine = QueryEngine(db_config)
+    try:
+        if args.create_fixture:
+            conn = engine.create_connection()
+            try:
+                created = create_fixture(conn, args.create_fixture)
+            finally:
+                conn.close()
+            print(f"Fixture rows created: {created}", file=sys.stderr)
+        engine.connect()
+    except Exception as e:
+        print(f"Error: cannot use fixture database: {e}", file=sys.stderr)
+        return 1
+    finally:
+        engine.close()
+
+    if not args.trace:
+        return 0
+    events = load_trace(args.trace)
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Error: no display ({e}); run under xvfb-run", file=sys.stderr)
+        return 1
+
+    config = Config()
+    config.db_config = db_config
+    config.sources = []
+
+    app = MediaBrowser(root, config=config, autostart=False)
+    replayer = Replayer(app, events, speed=args.speed, stall_threshold=args.stall_ms / 1000,
+                        settle=args.settle)
+    try:
+        report = replayer.run()
+    finally:
+        app.shutdown()
+        root.destroy()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    if args.max_stall_ms is not None and report['longest_stall_ms'] > args.max_stall_ms:
+        return 2
+    preview_p95 = report['time_to_preview'].get('p95_ms')
+    if args.max_preview_ms is not None and preview_p95 is not None and preview_p95 > args.max_preview_ms:
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
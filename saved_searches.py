@@ -0,0 +1,135 @@
+import hashlib
+import json
+import threading
+import time
+
+from config import CONFIG_DIR
+from query_engine import SearchFilter
+
+SAVED_SEARCHES_FILE = CONFIG_DIR / 'saved_searches.json'
+CACHE_DIR = CONFIG_DIR / 'saved_search_cache'
+
+
+class SavedSearches:
+    """Named searches plus a local snapshot of each one's first page.
+
+    Definitions live in ~/.mediabrowser/saved_searches.json. A snapshot keeps
+    the result keys and the first page rows with md5(preview) instead of the
+    blob; the blobs themselves come from the PreviewCache. Opening a saved
+    search shows the snapshot at once, then `revalidate` queries the server
+    and reports only what changed.
+    """
+
+    def __init__(self, file=SAVED_SEARCHES_FILE, cache_dir=CACHE_DIR):
+        self.file = file
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.searches = []
+        self.load()
+
+    def load(self):
+        """Load saved searches from file"""
+        if not self.file.exists():
+            return
+        try:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                self.searches = json.load(f)
+        except Exception as e:
+            print(f"Error loading saved searches: {e}")
+
+    def save(self):
+        """Save saved searches to file"""
+        try:
+            CONFIG_DIR.mkdir(exist_ok=True, parents=True)
+            with open(self.file, 'w', encoding='utf-8') as f:
+                json.dump(self.searches, f, indent=2, ensure_ascii=False)
+            return True
+        except Exception as e:
+            print(f"Error saving saved searches: {e}")
+            return False
+
+    def names(self):
+        return [search['name'] for search in self.searches]
+
+    def get(self, name):
+        for search in self.searches:
+            if search['name'] == name:
+                return search
+        return None
+
+    def add(self, name, search_filter):
+        """Save or overwrite a search under the given name"""
+        entry = dict(search_filter.to_dict(), name=name)
+        with self.lock:
+            self.searches = [search for search in self.searches if search['name'] != name]
+            self.searches.append(entry)
+            self.searches.sort(key=lambda search: search['name'].lower())
+        self.save()
+
+    def remove(self, name):
+        search = self.get(name)
+        with self.lock:
+            self.searches = [search for search in self.searches if search['name'] != name]
+        self.save()
+        if search:
+            try:
+                self.cache_path(self.filter_for(search)).unlink()
+            except OSError:
+                pass
+
+    @staticmethod
+    def filter_for(search):
+        return SearchFilter(search.get('search', ""), search.get('hide_no_preview', False), search.get('facets'))
+
+    def cache_path(self, search_filter):
+        digest = hashlib.sha1(search_filter.key().encode('utf-8')).hexdigest()
+        return self.cache_dir / f'{digest}.json'
+
+    def load_snapshot(self, search_filter):
+        """Return the cached snapshot {'time', 'rows'} or None"""
+        path = self.cache_path(search_filter)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading saved search cache: {e}")
+            return None
+
+    def save_snapshot(self, search_filter, rows):
+        """rows: [(abs_filename, rel_filename, preview_md5, latest_caption, exif)]"""
+        try:
+            self.cache_dir.mkdir(exist_ok=True, parents=True)
+            path = self.cache_path(search_filter)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'time': time.time(), 'rows': [list(row) for row in rows]}, f, ensure_ascii=False)
+            tmp_path.replace(path)
+            return True
+        except Exception as e:
+            print(f"Error saving saved search cache: {e}")
+            return False
+
+    def revalidate(self, engine, search_filter, limit, preview_cache, snapshot=None):
+        """Fetch the current first page and diff it against the snapshot.
+
+        Only previews whose digest is not in the preview cache are transferred.
+        Returns (rows, changed_keys) where rows are the fresh digest rows and
+        changed_keys holds keys that are new or differ from the snapshot.
+        """
+        rows = engine.fetch_digest_page(search_filter, limit)
+
+        missing = [row[0] for row in rows if row[2] and row[2] not in preview_cache]
+        if missing:
+            for abs_filename, digest, preview in engine.fetch_previews(missing):
+                if preview is not None:
+                    preview_cache.put(digest, bytes(preview))
+
+        old_rows = {}
+        if snapshot:
+            old_rows = {row[0]: list(row) for row in snapshot['rows']}
+        changed_keys = {row[0] for row in rows if old_rows.get(row[0]) != list(row)}
+
+        self.save_snapshot(search_filter, rows)
+        return rows, changed_keys
@@ -3,6 +3,21 @@ import PyInstaller.__main__
 additional_files = [
     ('config.py', '.'),
     ('config_dialog.py', '.'),
+    ('phash_index.py', '.'),
+    ('exporter.py', '.'),
+    ('export_dialog.py', '.'),
+    ('file_index.py', '.'),
+    ('tile_viewer.py', '.'),
+    ('timeline.py', '.'),
+    ('query_engine.py', '.'),
+    ('preview_cache.py', '.'),
+    ('fanout.py', '.'),
+    ('saved_searches.py', '.'),
+    ('facets.py', '.'),
+    ('gps_index.py', '.'),
+    ('replay.py', '.'),
+    ('folder_tree.py', '.'),
+    ('caption_index.py', '.'),
 ]
 
 # Create PyInstaller command
@@ -14,12 +29,30 @@ args = [
     '--icon=icon.ico',
     '--add-data=config.py;.',
     '--add-data=config_dialog.py;.',
+    '--add-data=phash_index.py;.',
+    '--add-data=exporter.py;.',
+    '--add-data=export_dialog.py;.',
+    '--add-data=file_index.py;.',
+    '--add-data=tile_viewer.py;.',
+    '--add-data=timeline.py;.',
+    '--add-data=query_engine.py;.',
+    '--add-data=preview_cache.py;.',
+    '--add-data=fanout.py;.',
+    '--add-data=saved_searches.py;.',
+    '--add-data=facets.py;.',
+    '--add-data=gps_index.py;.',
+    '--add-data=replay.py;.',
+    '--add-data=folder_tree.py;.',
+    '--add-data=caption_index.py;.',
     '--hidden-import=PIL._tkinter_finder',
     '--hidden-import=psycopg2',
     '--hidden-import=PIL',
     '--hidden-import=PIL.Image',
     '--hidden-import=PIL.ImageTk',
     '--hidden-import=PIL.ImageOps',
+    '--hidden-import=numpy',
+    '--hidden-import=scipy.sparse',
+    '--hidden-import=scipy.sparse.csgraph',
     '--collect-all=PIL',
     '--clean',
 ]
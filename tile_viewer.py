@@ -0,0 +1,575 @@
+import io
+import math
+import queue
+import struct
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+import numpy as np
+from PIL import Image, ImageTk
+
+TILE_SIZE = 256
+
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+class ByteLRU:
+    """LRU mapping that evicts least recently used values above a byte budget"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is None:
+                return None
+            self.items.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self.lock:
+            if key in self.items:
+                self.total_bytes -= self.items.pop(key)[1]
+            self.items[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self.items) > 1:
+                _, (_, evicted_size) = self.items.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.total_bytes = 0
+
+
+class JpegBands:
+    """Cuts a baseline JPEG with restart markers into bands that decode on their own.
+
+    A restart marker resets the entropy decoder, so when every MCU row is
+    made of whole restart intervals, the file's headers with the frame
+    height patched, followed by the intervals of some MCU rows, form a
+    valid JPEG of just those rows. Only the marker positions are kept in
+    memory; a band reads its own bytes and decodes with Image.open.
+    """
+
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path, header, height_offset, width, height, mcu_height, intervals_per_row, starts, ends):
+        self.path = path
+        self.header = header
+        self.height_offset = height_offset
+        self.width = width
+        self.height = height
+        self.mcu_height = mcu_height
+        self.intervals_per_row = intervals_per_row
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def open(cls, path):
+        """Index the restart intervals of a file; None if it cannot be cut into bands"""
+        with open(path, 'rb') as f:
+            if f.read(2) != b'\xff\xd8':
+                return None
+            header = bytearray(b'\xff\xd8')
+            frame = None
+            restart_interval = 0
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                length_bytes = f.read(2)
+                payload = f.read(int.from_bytes(length_bytes, 'big') - 2)
+                code = marker[1]
+                if code in (0xC0, 0xC1):
+                    # Baseline or extended sequential Huffman; height follows the precision byte
+                    height_offset = len(header) + 5
+                    height, width = struct.unpack('>HH', payload[1:5])
+                    components = payload[5]
+                    factors = [payload[7 + 3 * i] for i in range(components)]
+                    frame = (height_offset, width, height, components, factors)
+                elif 0xC2 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                    # Progressive, lossless or arithmetic coded
+                    return None
+                elif code == 0xDD:
+                    restart_interval = int.from_bytes(payload[:2], 'big')
+                header += marker + length_bytes + payload
+                if code == 0xDA:
+                    break
+            scan_start = f.tell()
+
+            if frame is None or not restart_interval:
+                return None
+            height_offset, width, height, components, factors = frame
+            # Several scans (non-interleaved) cannot be cut into bands
+            if not height or payload[0] != components:
+                return None
+            if components == 1:
+                mcu_width = mcu_height = 8
+            else:
+                mcu_width = 8 * max(factor >> 4 for factor in factors)
+                mcu_height = 8 * max(factor & 15 for factor in factors)
+            mcus_per_row = math.ceil(width / mcu_width)
+            if mcus_per_row % restart_interval:
+                return None
+            intervals_per_row = mcus_per_row // restart_interval
+
+            markers, end = cls._restart_markers(f, scan_start)
+            if end is None or len(markers) != intervals_per_row * math.ceil(height / mcu_height) - 1:
+                return None
+
+        starts = np.concatenate([[scan_start], markers + 2])
+        ends = np.concatenate([markers, [end]])
+        return cls(path, bytes(header), height_offset, width, height, mcu_height, intervals_per_row, starts, ends)
+
+    @classmethod
+    def _restart_markers(cls, f, offset):
+        """Positions of the RSTn markers of the scan starting at `offset`, and of its EOI"""
+        f.seek(offset)
+        found = []
+        tail = b''
+        while True:
+            chunk = f.read(cls.CHUNK_SIZE)
+            if not chunk:
+                return None, None
+            # Keep the last byte so a marker split across chunks is still seen
+            data = np.frombuffer(tail + chunk, dtype=np.uint8)
+            base = offset - len(tail)
+            prefixes = np.flatnonzero(data[:-1] == 0xFF)
+            codes = data[prefixes + 1]
+            end_of_image = prefixes[codes == 0xD9]
+            if len(end_of_image):
+                codes, prefixes = codes[prefixes < end_of_image[0]], prefixes[prefixes < end_of_image[0]]
+            found.append(prefixes[(codes & 0xF8) == 0xD0] + base)
+            if len(end_of_image):
+                return np.concatenate(found).astype(np.int64), int(end_of_image[0]) + base
+            tail = chunk[-1:]
+            offset += len(chunk)
+
+    def band(self, top, bottom):
+        """JPEG of the rows top..bottom; `top` must be a multiple of the MCU height"""
+        bottom = min(bottom, self.height)
+        first = top // self.mcu_height * self.intervals_per_row
+        last = math.ceil(bottom / self.mcu_height) * self.intervals_per_row
+        start = int(self.starts[first])
+
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = bytearray(f.read(int(self.ends[last - 1]) - start))
+        if len(data) != int(self.ends[last - 1]) - start:
+            raise OSError("Original changed while it was open")
+        # The decoder expects the restart markers of a scan to count up from RST0
+        for number, position in enumerate(self.ends[first:last - 1].tolist()):
+            data[position - start + 1] = 0xD0 + number % 8
+
+        header = bytearray(self.header)
+        header[self.height_offset:self.height_offset + 2] = (bottom - top).to_bytes(2, 'big')
+        return Image.open(io.BytesIO(bytes(header) + bytes(data) + b'\xff\xd9'))
+
+
+class TileSource:
+    """Decodes an image file as a pyramid of power-of-two levels.
+
+    Level n is the image scaled by 1/2**n. JPEG levels are decoded with
+    draft mode, so libjpeg scales during the DCT. Levels too large to keep
+    as one bitmap are decoded as horizontal strips when the JPEG has
+    restart markers to cut it at (JpegBands): each strip decodes on its
+    own and is cached on its own, so full resolution is available at any
+    size. Other formats are decoded and converted once for all levels.
+    Levels that can be neither cut nor kept whole are never decoded, the
+    viewer upsamples the finest level that fits instead.
+    """
+
+    def __init__(self, path, max_cache_bytes=512 * 1024 * 1024):
+        self.path = path
+        with Image.open(path) as image:
+            self.size = self._oriented_size(image)
+            self.orientation = image.getexif().get(0x0112)
+            self.is_jpeg = image.format == 'JPEG'
+
+        longest = max(self.size)
+        self.max_level = max(0, math.ceil(math.log2(longest / 1024))) if longest > 1024 else 0
+
+        self.bands = None
+        self.min_level = 0
+        self.strip_levels = set()
+        for level in range(self.max_level):
+            if self.level_bytes(level) <= max_cache_bytes // 2:
+                break
+            if self.is_jpeg and self.bands is None and not self.min_level:
+                try:
+                    self.bands = JpegBands.open(path) or False
+                except (OSError, ValueError, IndexError, struct.error) as e:
+                    print(f"Cannot cut {path} into bands: {e}")
+                    self.bands = False
+            if self.bands:
+                self.strip_levels.add(level)
+            else:
+                self.min_level = level + 1
+
+        self.levels = ByteLRU(max_cache_bytes)
+
+    @staticmethod
+    def _oriented_size(image):
+        width, height = image.size
+        if image.getexif().get(0x0112) in (5, 6, 7, 8):
+            return height, width
+        return width, height
+
+    def level_size(self, level):
+        width, height = self.size
+        return max(1, math.ceil(width / 2 ** level)), max(1, math.ceil(height / 2 ** level))
+
+    def level_bytes(self, level):
+        width, height = self.level_size(level)
+        return width * height * 3
+
+    def file_size(self, level):
+        """Size of a level before the EXIF orientation is applied"""
+        width, height = self.level_size(level)
+        if self.orientation in (5, 6, 7, 8):
+            return height, width
+        return width, height
+
+    def level_image(self, level):
+        """Decoded RGB image of the given level (blocking; call from a worker thread)"""
+        cached = self.levels.get(level)
+        if cached is not None:
+            return cached
+        if not self.is_jpeg:
+            return self._decode_levels()[level]
+
+        target = self.level_size(level)
+        with Image.open(self.path) as image:
+            request = self.file_size(level)
+            image.draft('RGB', request)
+
+            factor = min(image.size[0] // request[0], image.size[1] // request[1])
+            image = image.convert('RGB')
+            if factor > 1:
+                image = image.reduce(factor)
+            if self.orientation in ORIENTATION_TRANSPOSE:
+                image = image.transpose(ORIENTATION_TRANSPOSE[self.orientation])
+
+        if image.size != target:
+            image = image.resize(target, Image.Resampling.BILINEAR)
+
+        self.levels.put(level, image, self.level_bytes(level))
+        return image
+
+    def _decode_levels(self):
+        """Decode and convert a non-JPEG file once and build every kept level from it"""
+        with Image.open(self.path) as image:
+            image = image.convert('RGB')
+        if self.orientation in ORIENTATION_TRANSPOSE:
+            image = image.transpose(ORIENTATION_TRANSPOSE[self.orientation])
+
+        levels = {}
+        for level in range(self.max_level + 1):
+            if level:
+                image = image.reduce(2)
+            target = self.level_size(level)
+            if image.size != target:
+                image = image.resize(target, Image.Resampling.BILINEAR)
+            if level >= self.min_level:
+                levels[level] = image
+                self.levels.put(level, image, self.level_bytes(level))
+        return levels
+
+    def _decode_strip(self, level, index):
+        """Decode and cache one strip of TILE_SIZE rows of a level, in file orientation"""
+        width, height = self.file_size(level)
+        rows = min(TILE_SIZE, height - index * TILE_SIZE)
+        scale = 2 ** level
+        top = index * TILE_SIZE * scale
+        # Chroma upsampling reads the neighbouring rows, so decode a margin
+        # around the strip; a multiple of the scale keeps reduce() aligned
+        margin = math.lcm(self.bands.mcu_height, scale)
+        band_top = max(0, top - margin)
+        with self.bands.band(band_top, top + TILE_SIZE * scale + margin) as band:
+            # libjpeg scales by up to 1/8 while decoding, reduce() does the rest
+            draft_scale = min(scale, 8)
+            band.draft('RGB', (band.size[0] // draft_scale, band.size[1] // draft_scale))
+            strip = band.convert('RGB')
+        if scale > draft_scale:
+            strip = strip.reduce(scale // draft_scale)
+        offset = (top - band_top) // scale
+        strip = strip.crop((0, offset, width, min(offset + rows, strip.size[1])))
+        if strip.size != (width, rows):
+            raise OSError(f"Strip {index} of level {level} decoded to {strip.size}, expected {(width, rows)}")
+
+        self.levels.put((level, index), strip, width * rows * 3)
+        return strip
+
+    def _strip_region(self, level, box):
+        """Crop a box, in file orientation, out of the strips of a level"""
+        left, upper, right, lower = box
+        region = Image.new('RGB', (right - left, lower - upper))
+        for index in range(upper // TILE_SIZE, (lower - 1) // TILE_SIZE + 1):
+            strip = self.levels.get((level, index))
+            if strip is None:
+                strip = self._decode_strip(level, index)
+            top = index * TILE_SIZE
+            first, last = max(upper, top), min(lower, top + strip.size[1])
+            region.paste(strip.crop((left, first - top, right, last - top)), (0, first - upper))
+        return region
+
+    def _file_box(self, box, size):
+        """Map a box of the oriented level of the given size to file orientation"""
+        left, upper, right, lower = box
+        width, height = size
+        return {
+            2: (width - right, upper, width - left, lower),
+            3: (width - right, height - lower, width - left, height - upper),
+            4: (left, height - lower, right, height - upper),
+            5: (upper, left, lower, right),
+            6: (upper, width - right, lower, width - left),
+            7: (height - lower, width - right, height - upper, width - left),
+            8: (height - lower, left, height - upper, right),
+        }.get(self.orientation, box)
+
+    def tile(self, level, column, row, display_size):
+        """Tile of a level resized to display_size pixels per TILE_SIZE source pixels"""
+        if level in self.strip_levels:
+            width, height = self.level_size(level)
+            box = (column * TILE_SIZE, row * TILE_SIZE,
+                   min((column + 1) * TILE_SIZE, width), min((row + 1) * TILE_SIZE, height))
+            tile = self._strip_region(level, self._file_box(box, (width, height)))
+            if self.orientation in ORIENTATION_TRANSPOSE:
+                tile = tile.transpose(ORIENTATION_TRANSPOSE[self.orientation])
+        else:
+            image = self.level_image(level)
+            box = (column * TILE_SIZE, row * TILE_SIZE,
+                   min((column + 1) * TILE_SIZE, image.size[0]),
+                   min((row + 1) * TILE_SIZE, image.size[1]))
+            tile = image.crop(box)
+        if display_size != TILE_SIZE:
+            scale = display_size / TILE_SIZE
+            tile = tile.resize((max(1, round(tile.size[0] * scale)), max(1, round(tile.size[1] * scale))),
+                               Image.Resampling.BILINEAR)
+        return tile
+
+
+class TileViewer:
+    """Zoom/pan window for a full-resolution original.
+
+    Tiles for the visible area are decoded on a worker thread and turned into
+    PhotoImages on the Tk thread; both decoded levels and ready tiles are kept
+    in byte-capped LRU caches.
+    """
+
+    def __init__(self, parent, path, title=None, max_tile_bytes=128 * 1024 * 1024,
+                 max_level_bytes=512 * 1024 * 1024):
+        self.parent = parent
+        self.path = path
+        self.title = title or path
+        self.max_level_bytes = max_level_bytes
+        self.tiles = ByteLRU(max_tile_bytes)
+        self.source = None
+
+        self.zoom = 1.0
+        self.view_x = 0.0
+        self.view_y = 0.0
+        self.drag_start = None
+        self.visible_keys = frozenset()
+        self.pending = set()
+        self.requests = queue.LifoQueue()
+        self.render_scheduled = False
+        self.closed = False
+
+    def show(self):
+        """Show viewer window"""
+        self.window = tk.Toplevel(self.parent)
+        self.window.title(f"Original - {self.title}")
+        self.window.geometry("1200x800")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = ttk.Frame(self.window)
+        toolbar.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(toolbar, text="Fit", command=self.zoom_to_fit).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="100%", command=lambda: self.set_zoom(1.0)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="+", width=3, command=lambda: self.zoom_by(1.25)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="-", width=3, command=lambda: self.zoom_by(0.8)).pack(side=tk.LEFT, padx=2)
+        self.info_var = tk.StringVar(value="Opening...")
+        ttk.Label(toolbar, textvariable=self.info_var).pack(side=tk.LEFT, padx=10)
+
+        self.canvas = tk.Canvas(self.window, background='black', highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+
+        self.canvas.bind('<Configure>', lambda e: self.schedule_render())
+        self.canvas.bind('<ButtonPress-1>', self.on_drag_start)
+        self.canvas.bind('<B1-Motion>', self.on_drag)
+        self.canvas.bind('<MouseWheel>', self.on_wheel)
+        self.canvas.bind('<Button-4>', lambda e: self.zoom_by(1.25, e.x, e.y))
+        self.canvas.bind('<Button-5>', lambda e: self.zoom_by(0.8, e.x, e.y))
+
+        threading.Thread(target=self.open_source, daemon=True).start()
+        threading.Thread(target=self.decode_worker, daemon=True).start()
+
+    def open_source(self):
+        try:
+            source = TileSource(self.path, self.max_level_bytes)
+            self.parent.after(0, self.on_source_ready, source)
+        except Exception as e:
+            self.parent.after(0, lambda: self.info_var.set(f"Error opening original: {str(e)}"))
+
+    def on_source_ready(self, source):
+        if self.closed:
+            return
+        self.source = source
+        self.zoom_to_fit()
+
+    def close(self):
+        self.closed = True
+        self.requests.put(None)
+        self.tiles.clear()
+        if self.source:
+            self.source.levels.clear()
+        self.window.destroy()
+
+    def zoom_to_fit(self):
+        if not self.source:
+            return
+        width, height = self.source.size
+        canvas_width = max(self.canvas.winfo_width(), 1)
+        canvas_height = max(self.canvas.winfo_height(), 1)
+        self.zoom = min(canvas_width / width, canvas_height / height)
+        self.view_x = (width - canvas_width / self.zoom) / 2
+        self.view_y = (height - canvas_height / self.zoom) / 2
+        self.schedule_render()
+
+    def set_zoom(self, zoom, anchor_x=None, anchor_y=None):
+        if not self.source:
+            return
+        if anchor_x is None:
+            anchor_x = self.canvas.winfo_width() / 2
+            anchor_y = self.canvas.winfo_height() / 2
+
+        # Keep the image point under the anchor fixed while zooming
+        image_x = self.view_x + anchor_x / self.zoom
+        image_y = self.view_y + anchor_y / self.zoom
+        self.zoom = min(max(zoom, 0.01), 8.0)
+        self.view_x = image_x - anchor_x / self.zoom
+        self.view_y = image_y - anchor_y / self.zoom
+        self.schedule_render()
+
+    def zoom_by(self, factor, anchor_x=None, anchor_y=None):
+        self.set_zoom(self.zoom * factor, anchor_x, anchor_y)
+
+    def on_wheel(self, event):
+        self.zoom_by(1.25 if event.delta > 0 else 0.8, event.x, event.y)
+
+    def on_drag_start(self, event):
+        self.drag_start = (event.x, event.y, self.view_x, self.view_y)
+
+    def on_drag(self, event):
+        if not self.drag_start:
+            return
+        start_x, start_y, view_x, view_y = self.drag_start
+        self.view_x = view_x - (event.x - start_x) / self.zoom
+        self.view_y = view_y - (event.y - start_y) / self.zoom
+        self.schedule_render()
+
+    def schedule_render(self):
+        if not self.render_scheduled:
+            self.render_scheduled = True
+            self.canvas.after_idle(self.render)
+
+    def wanted_level(self):
+        """Pyramid level matching the zoom, before the memory cap"""
+        return math.floor(math.log2(1 / self.zoom)) if self.zoom < 1 else 0
+
+    def current_level(self):
+        return min(max(self.wanted_level(), self.source.min_level), self.source.max_level)
+
+    def render(self):
+        self.render_scheduled = False
+        if self.closed or not self.source:
+            return
+
+        level = self.current_level()
+        level_scale = self.zoom * 2 ** level
+        display_size = max(1, round(TILE_SIZE * level_scale))
+        level_width, level_height = self.source.level_size(level)
+
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        tile_span = TILE_SIZE * 2 ** level
+
+        first_column = max(0, int(self.view_x // tile_span))
+        first_row = max(0, int(self.view_y // tile_span))
+        last_column = min(math.ceil(level_width / TILE_SIZE) - 1,
+                          int((self.view_x + canvas_width / self.zoom) // tile_span))
+        last_row = min(math.ceil(level_height / TILE_SIZE) - 1,
+                       int((self.view_y + canvas_height / self.zoom) // tile_span))
+
+        self.canvas.delete("all")
+        visible_keys = set()
+        missing = 0
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                key = (level, column, row, display_size)
+                visible_keys.add(key)
+                x = (column * tile_span - self.view_x) * self.zoom
+                y = (row * tile_span - self.view_y) * self.zoom
+                photo = self.tiles.get(key)
+                if photo is not None:
+                    self.canvas.create_image(round(x), round(y), anchor=tk.NW, image=photo)
+                else:
+                    missing += 1
+                    if key not in self.pending:
+                        self.pending.add(key)
+                        self.requests.put(key)
+        self.visible_keys = frozenset(visible_keys)
+
+        width, height = self.source.size
+        status = f"{width}x{height}  zoom {self.zoom * 100:.0f}%"
+        if level > self.wanted_level():
+            # The original is too large to decode at this zoom; say so rather than pass the upsampling off as 100%
+            status += f"  (shown at {level_width}x{level_height}, capped to fit in memory)"
+        if missing:
+            status += f"  loading {missing} tiles..."
+        self.info_var.set(status)
+
+    def decode_worker(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                return
+            if key not in self.visible_keys:
+                # The view has moved on; it will ask again if it comes back into view
+                self.parent.after(0, self.on_tile_skipped, key)
+                continue
+            try:
+                tile = self.source.tile(*key)
+                self.parent.after(0, self.on_tile_ready, key, tile)
+            except Exception as e:
+                self.parent.after(0, self.pending.discard, key)
+                print(f"Error decoding tile {key}: {e}")
+
+    def on_tile_skipped(self, key):
+        self.pending.discard(key)
+        if key in self.visible_keys:
+            self.schedule_render()
+
+    def on_tile_ready(self, key, tile):
+        self.pending.discard(key)
+        if self.closed:
+            return
+        photo = ImageTk.PhotoImage(tile)
+        self.tiles.put(key, photo, tile.size[0] * tile.size[1] * 4)
+        self.schedule_render()
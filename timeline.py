@@ -0,0 +1,114 @@
+import json
+import re
+import threading
+import time
+
+from config import CONFIG_DIR
+from query_engine import CAPTURE_DATE_SQL
+
+CACHE_FILE = CONFIG_DIR / 'timeline_cache.json'
+
+
+def month_label(month):
+    """'2019:05' -> '2019-05'; empty month -> 'Unknown date'"""
+    if not month:
+        return "Unknown date"
+    return month.replace(':', '-')
+
+
+def jump_cursor(date_text):
+    """Seek cursor that starts the list at the end of the given day or month.
+
+    Accepts 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' (also with ':' separators).
+    Returns a (capture_date, rel_filename) pair to compare rows against.
+    """
+    match = re.fullmatch(r'\s*(\d{4})(?:[-:./](\d{1,2}))?(?:[-:./](\d{1,2}))?\s*', date_text)
+    if not match:
+        raise ValueError(f"Invalid date: {date_text}")
+    year, month, day = match.groups()
+    parts = [year]
+    if month:
+        parts.append(f"{int(month):02d}")
+    if day:
+        parts.append(f"{int(day):02d}")
+    # '~' sorts after every character that can follow the prefix in an EXIF date
+    return ':'.join(parts) + '~', ''
+
+
+class TimelineHistogram:
+    """Per-month image counts for a filter, from one GROUP BY query.
+
+    Results are cached in ~/.mediabrowser keyed by the WHERE clause and its
+    parameters, and reused until they are older than `max_age` seconds.
+    """
+
+    def __init__(self, cache_file=CACHE_FILE, max_age=3600, max_entries=50):
+        self.cache_file = cache_file
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        """Load cache from file"""
+        if not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            print(f"Error loading timeline cache: {e}")
+
+    def save(self):
+        """Save cache to file"""
+        try:
+            CONFIG_DIR.mkdir(exist_ok=True, parents=True)
+            with self.lock:
+                data = dict(self.entries)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            return True
+        except Exception as e:
+            print(f"Error saving timeline cache: {e}")
+            return False
+
+    @staticmethod
+    def cache_key(where_clause, params):
+        return json.dumps([where_clause, params], ensure_ascii=False)
+
+    def get(self, where_clause, params, conn, refresh=False):
+        """Return [(month, count)] newest first; month is 'YYYY:MM' or '' for undated rows.
+
+        With `conn` None only the cache is consulted, and None is returned on a miss.
+        """
+        key = self.cache_key(where_clause, params)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and not refresh and time.time() - entry['time'] < self.max_age:
+            return [tuple(item) for item in entry['months']]
+        if conn is None:
+            return None
+
+        # Placeholder dates such as '    :  :  ' count as undated
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT CASE WHEN {CAPTURE_DATE_SQL} ~ '^[0-9]{{4}}:[0-9]{{2}}'
+                        THEN substr({CAPTURE_DATE_SQL}, 1, 7) ELSE '' END AS month,
+                   count(*)
+            FROM dm.col_images
+            {where_clause}
+            GROUP BY 1
+            ORDER BY 1 DESC
+        """, params)
+        months = [(month, count) for month, count in cur.fetchall()]
+        cur.close()
+
+        with self.lock:
+            self.entries[key] = {'time': time.time(), 'months': months}
+            if len(self.entries) > self.max_entries:
+                oldest = sorted(self.entries, key=lambda k: self.entries[k]['time'])
+                for old_key in oldest[:len(self.entries) - self.max_entries]:
+                    del self.entries[old_key]
+        self.save()
+        return months